@@ -0,0 +1,195 @@
+import hashlib
+import json
+import secrets
+from datetime import date
+from functools import wraps
+
+from flask import Blueprint, g, jsonify, request
+from werkzeug.security import check_password_hash
+
+import entries as entry_store
+from db import get_db
+
+# Versioned JSON API for scripts and mobile clients.
+#
+# Clients exchange a username and password for a bearer token once
+# (POST /api/v1/tokens) and send it as "Authorization: Bearer <token>".
+# Reads carry an ETag; sending it back in If-None-Match returns an empty
+# 304 when nothing changed. Entry listings derive their ETag from the
+# habit's data_version, so a poll that gets a 304 never touches the
+# entries table.
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MAX_BATCH = 1000
+
+
+def error(message, status=400, **extra):
+    return jsonify(dict(error=message, **extra)), status
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return error('Missing bearer token', 401)
+        conn = get_db()
+        row = conn.execute('SELECT id, user_id FROM api_tokens WHERE token_hash = ?',
+                           (hash_token(token.strip()),)).fetchone()
+        if row is None:
+            return error('Invalid token', 401)
+        g.api_user_id = row['user_id']
+        g.api_token_id = row['id']
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def etag_response(payload, etag=None):
+    """JSON response with an ETag, or an empty 304 if the client already has it."""
+    body = json.dumps(payload, sort_keys=True)
+    etag = etag or hashlib.sha1(body.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+
+@bp.route('/tokens', methods=['POST'])
+def create_token():
+    data = request.get_json(silent=True) or {}
+    conn = get_db()
+    user = conn.execute('SELECT * FROM users WHERE username = ?', (data.get('username'),)).fetchone()
+    if user is None or not check_password_hash(user['password_hash'], data.get('password') or ''):
+        return error('Invalid username or password', 401)
+
+    token = secrets.token_urlsafe(32)
+    with conn:
+        conn.execute('INSERT INTO api_tokens (user_id, name, token_hash) VALUES (?, ?, ?)',
+                     (user['id'], data.get('name'), hash_token(token)))
+    return jsonify({'token': token}), 201
+
+
+@bp.route('/tokens/current', methods=['DELETE'])
+@token_required
+def revoke_token():
+    conn = get_db()
+    with conn:
+        conn.execute('DELETE FROM api_tokens WHERE id = ?', (g.api_token_id,))
+    return '', 204
+
+
+@bp.route('/boards')
+@token_required
+def list_boards():
+    conn = get_db()
+    boards = conn.execute('SELECT id, name, description, board_type, created FROM habit_boards WHERE user_id = ?',
+                          (g.api_user_id,)).fetchall()
+    return etag_response({'boards': [dict(board) for board in boards]})
+
+
+@bp.route('/habits')
+@token_required
+def list_habits():
+    conn = get_db()
+    board_id = request.args.get('board_id', type=int)
+    sql = '''
+        SELECT h.id, h.board_id, h.name, h.description, h.frequency, h.variable_type, h.data_version,
+               CASE WHEN h.variable_type = 'categorical' THEN
+                   (SELECT json_group_array(o.option_value) FROM habit_options o WHERE o.habit_id = h.id)
+               END AS options
+        FROM habits h
+        WHERE h.user_id = ?
+    '''
+    params = [g.api_user_id]
+    if board_id is not None:
+        sql += ' AND h.board_id = ?'
+        params.append(board_id)
+
+    habits = []
+    for row in conn.execute(sql, params):
+        habit = dict(row)
+        habit['options'] = json.loads(habit['options']) if habit['options'] is not None else None
+        habits.append(habit)
+    return etag_response({'habits': habits})
+
+
+@bp.route('/habits/<int:habit_id>/entries')
+@token_required
+def list_entries(habit_id):
+    conn = get_db()
+    habit = conn.execute('SELECT id, data_version FROM habits WHERE id = ? AND user_id = ?',
+                         (habit_id, g.api_user_id)).fetchone()
+    if habit is None:
+        return error('Habit not found', 404)
+
+    cursor = request.args.get('before')
+    limit = min(max(request.args.get('limit', entry_store.ENTRY_PAGE_SIZE, type=int), 1), 500)
+    etag = f"{habit_id}-{habit['data_version']}-{cursor or ''}-{limit}"
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    try:
+        entries, next_cursor = entry_store.entry_page(conn, habit_id, cursor, limit)
+    except ValueError:
+        return error('Invalid cursor')
+    return etag_response({
+        'entries': [{'id': entry['id'], 'date': entry['date'], 'value': entry['value'],
+                     'num_value': entry['num_value']} for entry in entries],
+        'next': next_cursor,
+    }, etag)
+
+
+@bp.route('/entries', methods=['POST'])
+@token_required
+def write_entries():
+    """
+    Write a batch of entries in one transaction.
+
+    Body: {"entries": [{"habit_id": 1, "date": "2024-01-31", "value": "45"}, ...]}
+
+    Every entry is validated first; if any is invalid nothing is written and
+    the response lists the problems by index. Entries for a habit and day
+    that already exist are overwritten.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('entries') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return error('Expected {"entries": [...]}')
+    if len(items) > MAX_BATCH:
+        return error(f'At most {MAX_BATCH} entries per request')
+
+    conn = get_db()
+    habits = {row['id']: row for row in conn.execute(
+        'SELECT id, name, variable_type FROM habits WHERE user_id = ?', (g.api_user_id,))}
+    options = entry_store.load_option_spellings(conn, list(habits))
+
+    rows, problems = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Expected an object with habit_id, date and value')
+            try:
+                habit = habits.get(int(item.get('habit_id')))
+            except (TypeError, ValueError):
+                habit = None
+            if habit is None:
+                raise ValueError(f"Unknown habit {item.get('habit_id')!r}")
+            day = date.fromisoformat(str(item.get('date'))).isoformat()
+            if item.get('value') is None:
+                raise ValueError('Missing value')
+            rows.append((habit['id'], day, entry_store.clean_value(habit, options[habit['id']], item['value'])))
+        except ValueError as e:
+            problems.append({'index': index, 'message': str(e)})
+
+    if problems:
+        return error('Invalid entries; nothing was written', 400, problems=problems)
+
+    with conn:
+        written = entry_store.upsert_entries(conn, rows)
+    return jsonify({'written': written})
@@ -1,20 +1,88 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-import sqlite3
+from flask import Flask, current_app, render_template, request, redirect, url_for, flash, session
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
-from datetime import datetime, timedelta
-from flask import jsonify
+import json
+import os
+import secrets
+from datetime import date, datetime, timedelta
+from flask import jsonify, Response, stream_with_context
 from flask_cors import CORS
-import ml_utils  # Import our ML utilities
-
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-app.secret_key = 'your_secret_key'  # Change this to a random secret key
-
-def get_db_connection():
-    conn = sqlite3.connect('habits.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+import api
+import config
+import correlations
+import csv_import
+import db
+import export
+import entries as entry_store
+import features
+import metrics
+import migrations
+import model_cache
+import page_cache
+import training_jobs
+from db import get_db
+
+# numpy, pandas and scikit-learn take most of a second and ~100 MB to import,
+# and only the model, schedule and plot routes use them. Those routes import
+# ml_utils, training_data and plot_data when first called, so web workers
+# boot without the ML stack (unless PRELOAD_ML asks for it, see wsgi.py).
+
+# Routes are collected here and added to every app create_app builds; like a
+# blueprint, but the endpoints keep their plain names for url_for
+ROUTES = []
+
+def route(rule, **options):
+    def register(view_func):
+        ROUTES.append((rule, options, view_func))
+        return view_func
+    return register
+
+def create_app(overrides=None):
+    """
+    Build the app.
+    
+    Args:
+        overrides: Optional settings applied on top of config.Config, which
+            reads the HABITS_* environment variables
+    
+    Returns:
+        app: The configured Flask app, with the database migrated
+    """
+    app = Flask(__name__)
+    app.config.from_object(config.Config())
+    app.config.update(overrides or {})
+    if not app.config['SECRET_KEY']:
+        # A random key works for a single process (or workers forked from a
+        # preloaded one) but logs everyone out on restart
+        app.logger.warning('HABITS_SECRET_KEY is not set; using a random session key')
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+    
+    CORS(app)  # Enable CORS for all routes
+    db.init_app(app)  # Pooled connections, released on app context teardown
+    metrics.init_app(app)  # Route latency and per-request SQL counts, served at /metrics
+    migrations.migrate(app.config['DATABASE'])  # Upgrade the schema in place
+    model_cache.init_app(app)  # Trained models on disk, keyed by habit data versions
+    training_jobs.init_app(app)  # Background process pool for model training
+    correlations.init_app(app)  # Per-user correlation matrices, rebuilt when entries change
+    features.init_app(app)  # Per-habit lag/rolling/streak features for model training
+    page_cache.init_app(app)  # Rendered dashboard pages per user, dropped on the user's next write
+    app.register_blueprint(api.bp)  # JSON API under /api/v1
+    for rule, options, view_func in ROUTES:
+        app.add_url_rule(rule, view_func=view_func, **options)
+    
+    if app.config['PRELOAD_ML']:
+        # Loaded before a preloading server forks, so workers share one copy
+        import ml_utils, training_data, plot_data
+    return app
+
+def __getattr__(name):
+    # `from app import app` (and `gunicorn app:app`) still work: the first
+    # lookup builds an app from the environment
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def login_required(f):
     @wraps(f)
@@ -24,15 +92,22 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/')
+def entry_page_or_first(conn, habit_id):
+    # Page of entries for ?before=<cursor>; a bad cursor falls back to the newest page
+    try:
+        return entry_store.entry_page(conn, habit_id, request.args.get('before'))
+    except ValueError:
+        return entry_store.entry_page(conn, habit_id)
+
+@route('/')
 @login_required
+@page_cache.cached
 def index():
-    conn = get_db_connection()
+    conn = get_db()
     habits = conn.execute('SELECT * FROM habits WHERE user_id = ?', (session['user_id'],)).fetchall()
-    conn.close()
     return render_template('index.html', habits=habits)
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -43,7 +118,7 @@ def register():
             flash('Passwords do not match')
             return redirect(url_for('register'))
         
-        conn = get_db_connection()
+        conn = get_db()
         
         if conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone() is not None:
             flash('Username already exists')
@@ -54,17 +129,15 @@ def register():
             flash('Registration successful')
             return redirect(url_for('login'))
         
-        conn.close()
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        conn = get_db_connection()
+        conn = get_db()
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
         
         if user and check_password_hash(user['password_hash'], password):
             session['user_id'] = user['id']
@@ -75,46 +148,98 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     session.pop('user_id', None)
     flash('Logged out successfully')
     return redirect(url_for('login'))
 
-@app.route('/boards', methods=['GET', 'POST'])
+@route('/boards', methods=['GET', 'POST'])
 @login_required
+@page_cache.cached
 def boards():
     if request.method == 'POST':
         name = request.form['name']
         description = request.form['description']
         board_type = request.form['board_type']
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute('INSERT INTO habit_boards (user_id, name, description, board_type) VALUES (?, ?, ?, ?)',
                      (session['user_id'], name, description, board_type))
         conn.commit()
-        conn.close()
         flash('New board created successfully')
         return redirect(url_for('boards'))
     
-    conn = get_db_connection()
+    conn = get_db()
     boards = conn.execute('SELECT * FROM habit_boards WHERE user_id = ?', (session['user_id'],)).fetchall()
-    conn.close()
-    return render_template('boards.html', boards=boards)
+    return render_template('boards.html', boards=boards, parquet_available=export.parquet_available())
 
-@app.route('/board/<int:board_id>')
+@route('/board/<int:board_id>')
 @login_required
+@page_cache.cached
 def view_board(board_id):
-    conn = get_db_connection()
+    conn = get_db()
     board = conn.execute('SELECT * FROM habit_boards WHERE id = ? AND user_id = ?', 
                          (board_id, session['user_id'])).fetchone()
     habits = conn.execute('SELECT * FROM habits WHERE board_id = ?', (board_id,)).fetchall()
-    conn.close()
-    return render_template('view_board.html', board=board, habits=habits)
+    return render_template('view_board.html', board=board, habits=habits,
+                           parquet_available=export.parquet_available())
 
-@app.route('/board/<int:board_id>/add_habit', methods=['GET', 'POST'])
+@route('/board/<int:board_id>/import', methods=['GET', 'POST'])
+@login_required
+def import_entries(board_id):
+    conn = get_db()
+    board = conn.execute('SELECT * FROM habit_boards WHERE id = ? AND user_id = ?', 
+                         (board_id, session['user_id'])).fetchone()
+    if board is None:
+        flash('Board not found or unauthorized')
+        return redirect(url_for('boards'))
+    habits = conn.execute('SELECT name, variable_type FROM habits WHERE board_id = ?', (board_id,)).fetchall()
+    
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV file to import')
+        else:
+            # Parsed straight from the upload stream, a chunk at a time
+            report = csv_import.import_csv(conn, board_id, upload.stream).to_dict()
+    
+    return render_template('import_entries.html', board=board, habits=habits, report=report)
+
+@route('/export/entries.<fmt>')
+@route('/board/<int:board_id>/export/entries.<fmt>')
+@login_required
+def export_entries(fmt, board_id=None):
+    conn = get_db()
+    filename = 'habit-entries'
+    if board_id is not None:
+        board = conn.execute('SELECT id FROM habit_boards WHERE id = ? AND user_id = ?', 
+                             (board_id, session['user_id'])).fetchone()
+        if board is None:
+            flash('Board not found or unauthorized')
+            return redirect(url_for('boards'))
+        filename = f'board-{board_id}-entries'
+    
+    # Streamed from the cursor a batch at a time rather than built in memory
+    if fmt == 'csv':
+        chunks, mimetype = export.iter_csv(conn, session['user_id'], board_id), 'text/csv'
+    elif fmt == 'parquet':
+        try:
+            chunks, mimetype = export.iter_parquet(conn, session['user_id'], board_id), 'application/vnd.apache.parquet'
+        except ImportError:
+            flash('Parquet export is not available on this server')
+            return redirect(url_for('view_board', board_id=board_id) if board_id is not None else url_for('boards'))
+    else:
+        flash('Unknown export format')
+        return redirect(url_for('view_board', board_id=board_id) if board_id is not None else url_for('boards'))
+    
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'})
+
+@route('/board/<int:board_id>/add_habit', methods=['GET', 'POST'])
 @login_required
 def add_habit(board_id):
-    conn = get_db_connection()
+    conn = get_db()
     board = conn.execute('SELECT * FROM habit_boards WHERE id = ? AND user_id = ?', 
                          (board_id, session['user_id'])).fetchone()
     
@@ -139,17 +264,15 @@ def add_habit(board_id):
                                    (habit_id, option.strip()))
         
         conn.commit()
-        conn.close()
         flash('New habit added successfully')
         return redirect(url_for('view_board', board_id=board_id))
     
-    conn.close()
     return render_template('add_habit.html', board_id=board_id, board=board)
 
-@app.route('/board/<int:board_id>/log_all', methods=['GET', 'POST'])
+@route('/board/<int:board_id>/log_all', methods=['GET', 'POST'])
 @login_required
 def log_all_habits(board_id):
-    conn = get_db_connection()
+    conn = get_db()
     board = conn.execute('SELECT * FROM habit_boards WHERE id = ? AND user_id = ?', 
                          (board_id, session['user_id'])).fetchone()
     
@@ -157,47 +280,50 @@ def log_all_habits(board_id):
     today = datetime.now().date()
 
     if request.method == 'POST':
-        log_date = request.form['log_date']
+        try:
+            log_date = date.fromisoformat(request.form['log_date']).isoformat()
+        except ValueError:
+            flash('Enter the date as YYYY-MM-DD')
+            return redirect(url_for('log_all_habits', board_id=board_id))
+        # Only accept habits that belong to this board and user
+        board_habit_ids = {row['id'] for row in conn.execute(
+            'SELECT id FROM habits WHERE board_id = ? AND user_id = ?', (board_id, session['user_id']))}
+        rows = []
         for key, value in request.form.items():
             if key.startswith('habit_'):
                 habit_id = int(key.split('_')[1])
-                if value:  # Only log if a value is provided (not blank)
-                    # Check if an entry already exists for this date and habit
-                    existing = conn.execute('SELECT id FROM entries WHERE habit_id = ? AND date = ?', 
-                                           (habit_id, log_date)).fetchone()
-                    if existing:
-                        # Update existing entry
-                        conn.execute('UPDATE entries SET value = ? WHERE id = ?', 
-                                     (value, existing['id']))
-                    else:
-                        # Create new entry
-                        conn.execute('INSERT INTO entries (habit_id, date, value) VALUES (?, ?, ?)',
-                                     (habit_id, log_date, value))
-        conn.commit()
+                if value and habit_id in board_habit_ids:  # Only log if a value is provided (not blank)
+                    rows.append((habit_id, log_date, value))
+
+        # Insert or update every habit for the day in a single transaction
+        with conn:
+            entry_store.upsert_entries(conn, rows)
         flash('Habits logged successfully')
         return redirect(url_for('view_board', board_id=board_id))
 
-    # Fetch habits and their recent entries
+    # Fetch every habit on the board with its last entry date and options in
+    # one statement. The correlated subqueries are answered by the
+    # (habit_id, date) and habit_options(habit_id) indexes.
+    habits = conn.execute('''
+        SELECT h.*,
+               (SELECT MAX(e.date) FROM entries e WHERE e.habit_id = h.id) AS last_date,
+               CASE WHEN h.variable_type = 'categorical' THEN
+                   (SELECT json_group_array(o.option_value) FROM habit_options o WHERE o.habit_id = h.id)
+               END AS options
+        FROM habits h
+        WHERE h.board_id = ?
+    ''', (board_id,)).fetchall()
+
     habits_to_log = []
-    habits = conn.execute('SELECT * FROM habits WHERE board_id = ?', (board_id,)).fetchall()
-    for habit in habits:
-        # Get the most recent entry for this habit
-        last_entry = conn.execute('''
-            SELECT date FROM entries 
-            WHERE habit_id = ? 
-            ORDER BY date DESC LIMIT 1
-        ''', (habit['id'],)).fetchone()
-
-        # Get options for categorical habits
-        if habit['variable_type'] == 'categorical':
-            options = conn.execute('SELECT option_value FROM habit_options WHERE habit_id = ?', (habit['id'],)).fetchall()
-            habit = dict(habit)
-            habit['options'] = [option['option_value'] for option in options]
+    for row in habits:
+        habit = dict(row)
+        if habit['options'] is not None:
+            habit['options'] = json.loads(habit['options'])
 
         # Determine if the habit should be logged today
         should_log = True
-        if last_entry:
-            last_date = datetime.strptime(last_entry['date'], '%Y-%m-%d').date()
+        if habit['last_date']:
+            last_date = datetime.strptime(habit['last_date'], '%Y-%m-%d').date()
             days_since_last = (today - last_date).days
             if habit['frequency'] == 'daily' and days_since_last < 1:
                 should_log = False
@@ -209,33 +335,40 @@ def log_all_habits(board_id):
         if should_log:
             habits_to_log.append(habit)
 
-    conn.close()
     return render_template('log_all_habits.html', board=board, habits=habits_to_log, today=today.isoformat())
 
-@app.route('/habit/<int:habit_id>/log', methods=['GET', 'POST'])
+@route('/habit/<int:habit_id>/log', methods=['GET', 'POST'])
 @login_required
 def log_habit(habit_id):
-    conn = get_db_connection()
+    conn = get_db()
     habit = conn.execute('SELECT * FROM habits WHERE id = ? AND user_id = ?', 
                          (habit_id, session['user_id'])).fetchone()
     
     if request.method == 'POST':
-        date = request.form['date']
+        try:
+            day = date.fromisoformat(request.form['date']).isoformat()
+        except ValueError:
+            flash('Enter the date as YYYY-MM-DD')
+            return redirect(url_for('log_habit', habit_id=habit_id))
         value = request.form['value']
-        conn.execute('INSERT INTO entries (habit_id, date, value) VALUES (?, ?, ?)',
-                     (habit_id, date, value))
-        conn.commit()
+        # One entry per habit per day; logging the same day again replaces it
+        with conn:
+            entry_store.upsert_entries(conn, [(habit_id, day, value)])
         flash('Habit logged successfully')
         return redirect(url_for('view_habit', habit_id=habit_id))
     
-    entries = conn.execute('SELECT * FROM entries WHERE habit_id = ? ORDER BY date DESC', (habit_id,)).fetchall()
-    conn.close()
-    return render_template('log_habit.html', habit=habit, entries=entries)
+    entries, next_cursor = entry_page_or_first(conn, habit_id)
+    return render_template('log_habit.html', habit=habit, entries=entries, next_cursor=next_cursor)
 
-@app.route('/board/<int:board_id>/delete', methods=['POST'])
+@route('/board/<int:board_id>/delete', methods=['POST'])
 @login_required
 def delete_board(board_id):
-    conn = get_db_connection()
+    conn = get_db()
+    board = conn.execute('SELECT id FROM habit_boards WHERE id = ? AND user_id = ?',
+                         (board_id, session['user_id'])).fetchone()
+    if board is None:
+        flash('Board not found or unauthorized')
+        return redirect(url_for('boards'))
     
     # First, delete all entries associated with habits in this board
     conn.execute('''
@@ -243,6 +376,11 @@ def delete_board(board_id):
         WHERE habit_id IN (SELECT id FROM habits WHERE board_id = ?)
     ''', (board_id,))
     
+    conn.execute('''
+        DELETE FROM habit_rollups
+        WHERE habit_id IN (SELECT id FROM habits WHERE board_id = ?)
+    ''', (board_id,))
+    
     # Delete all habit options associated with habits in this board
     conn.execute('''
         DELETE FROM habit_options 
@@ -256,23 +394,32 @@ def delete_board(board_id):
     conn.execute('DELETE FROM habit_boards WHERE id = ? AND user_id = ?', (board_id, session['user_id']))
     
     conn.commit()
-    conn.close()
     
     flash('Habit board deleted successfully')
     return redirect(url_for('boards'))
 
-@app.route('/stats')
+@route('/stats')
 @login_required
+@page_cache.cached
 def stats():
-    conn = get_db_connection()
+    conn = get_db()
     habits = conn.execute('SELECT id, name, variable_type FROM habits WHERE user_id = ?', (session['user_id'],)).fetchall()
-    conn.close()
     return render_template('stats.html', habits=habits)
 
-@app.route('/models', methods=['GET', 'POST'])
+@route('/stats/correlations')
+@login_required
+def stats_correlations():
+    # Correlation matrices across all numeric/boolean habits, cached until
+    # any of the user's habits gets a new entry
+    max_lag = min(request.args.get('max_lag', 1, type=int), 30)
+    min_periods = max(request.args.get('min_periods', 10, type=int), 3)
+    report = correlations.get_cache().get_report(get_db(), session['user_id'], max_lag, min_periods)
+    return jsonify(report)
+
+@route('/models', methods=['GET', 'POST'])
 @login_required
 def models():
-    conn = get_db_connection()
+    conn = get_db()
     # Get all user's habits that have sufficient data for modeling
     habits = conn.execute('''
         SELECT h.id, h.name, h.variable_type, COUNT(e.id) as entry_count 
@@ -293,102 +440,143 @@ def models():
         target_habit_id = request.form['target_habit']
         feature_habit_ids = request.form.getlist('feature_habits')
         optimization_goal = request.form['optimization_goal']  # 'maximize' or 'minimize'
-        model_type = request.form['model_type']  # 'random_forest', 'svm', etc.
+        model_type = request.form['model_type']  # 'random_forest', 'svm', etc. or 'auto' to compare them
+        incremental = bool(request.form.get('incremental'))  # Update the last model with new days
         
         # Fetch the target habit details
-        target_habit = conn.execute('SELECT * FROM habits WHERE id = ?', (target_habit_id,)).fetchone()
-        
-        # Fetch data for the target and feature habits
-        data = {}
+        target_habit = conn.execute('SELECT * FROM habits WHERE id = ? AND user_id = ?',
+                                    (target_habit_id, session['user_id'])).fetchone()
         
-        # Get target data
-        target_data = conn.execute('''
-            SELECT date, value FROM entries 
-            WHERE habit_id = ? 
-            ORDER BY date
-        ''', (target_habit_id,)).fetchall()
+        # Only the user's own habits can be used as features
+        allowed_ids = {h['id'] for h in feature_habits}
+        feature_habit_ids = [int(habit_id) for habit_id in feature_habit_ids if int(habit_id) in allowed_ids]
         
-        data['target'] = {
-            'name': target_habit['name'],
-            'dates': [entry['date'] for entry in target_data],
-            'values': [float(entry['value']) if target_habit['variable_type'] == 'numeric' 
-                      else 1 if entry['value'].lower() in ('true', '1', 'yes') else 0 
-                      for entry in target_data]
-        }
-        
-        # Get feature data
-        data['features'] = []
-        for feature_id in feature_habit_ids:
-            feature = conn.execute('SELECT * FROM habits WHERE id = ?', (feature_id,)).fetchone()
-            feature_data = conn.execute('''
-                SELECT date, value FROM entries 
-                WHERE habit_id = ? 
-                ORDER BY date
-            ''', (feature_id,)).fetchall()
+        # Process data and queue training
+        try:
+            import ml_utils
+            import training_data
             
-            feature_values = []
-            if feature['variable_type'] == 'numeric':
-                feature_values = [float(entry['value']) for entry in feature_data]
-            elif feature['variable_type'] == 'boolean':
-                feature_values = [1 if entry['value'].lower() in ('true', '1', 'yes') else 0 for entry in feature_data]
-            elif feature['variable_type'] == 'categorical':
-                # Get unique categories
-                categories = conn.execute('''
-                    SELECT DISTINCT value FROM entries WHERE habit_id = ?
-                ''', (feature_id,)).fetchall()
-                categories = [c['value'] for c in categories]
-                
-                # One-hot encode categorical values
-                for entry in feature_data:
-                    encoded = [1 if entry['value'] == cat else 0 for cat in categories]
-                    feature_values.append(encoded)
+            # Load the target and all features in one query, already pivoted by date
+            feature_options = features.parse_options(request.form)
+            with metrics.span('load_training_matrix'):
+                X, y, feature_names, layout = training_data.load_training_matrix(
+                    conn, target_habit['id'], feature_habit_ids, feature_options, features.get_cache())
             
-            data['features'].append({
-                'id': feature['id'],
-                'name': feature['name'],
-                'type': feature['variable_type'],
-                'dates': [entry['date'] for entry in feature_data],
-                'values': feature_values
-            })
-        
-        # Process data and train model
-        try:
-            # Preprocess data
-            X, y, feature_names = ml_utils.preprocess_data(data)
+            context = {'target_habit': dict(target_habit), 'optimization_goal': optimization_goal}
+            queue = training_jobs.get_queue()
             
-            # Train model
+            # Reuse the trained model if nothing it depends on has changed
+            cache = model_cache.get_cache()
             is_classification = target_habit['variable_type'] == 'boolean'
-            model, scaler, X_test, y_test, accuracy = ml_utils.train_model(X, y, model_type, is_classification)
-            
-            # Generate recommendations
-            recommendations = ml_utils.generate_recommendations(data, model, scaler, feature_names, optimization_goal)
+            key_options = {'split': 'chronological', 'features': feature_options}
+            if incremental:
+                key_options['incremental'] = True
+            cache_key = model_cache.training_key(conn, target_habit['id'], feature_habit_ids, model_type,
+                                                 **key_options)
+            lineage_key = model_cache.lineage_key(target_habit['id'], feature_habit_ids, model_type, **key_options)
+            cached = cache.get(cache_key)
+            if cached is None and incremental:
+                # Otherwise bring the last model up to date with the days
+                # logged since, if it can be
+                previous = cache.get(lineage_key)
+                if previous is not None and previous[2] == feature_names and 'incremental' in previous[4]:
+                    model, scaler, _, accuracy, evaluation = previous
+                    try:
+                        with metrics.span('update_model'):
+                            model, scaler, state = ml_utils.update_model(model, scaler, X, y,
+                                                                         evaluation['incremental'],
+                                                                         is_classification)
+                    except ValueError:
+                        pass  # Retrain below
+                    else:
+                        cached = (model, scaler, feature_names, accuracy, dict(evaluation, incremental=state))
+                        cache.put(cache_key, cached)
+                        cache.put(lineage_key, cached)
+            if cached is not None:
+                model, scaler, feature_names, accuracy, evaluation = cached
+                with metrics.span('generate_recommendations'):
+                    recommendations = ml_utils.generate_recommendations(X, model, scaler, feature_names,
+                                                                        optimization_goal, layout)
+                job = queue.complete(session['user_id'], context,
+                                     {'recommendations': recommendations, 'evaluation': evaluation})
+            else:
+                # Train in the background so the request returns straight away
+                registry = metrics.get_metrics()
+                
+                def on_success(result):
+                    # Runs on the queue's callback thread, outside any request
+                    for name, seconds in result[4]['timings'].items():
+                        registry.observe_span(name, seconds)
+                    entry = (result[0], result[1], feature_names, result[2], result[4])
+                    cache.put(cache_key, entry)
+                    if 'incremental' in result[4]:
+                        cache.put(lineage_key, entry)
+                
+                job = queue.submit(session['user_id'], context, training_jobs.run_training,
+                                   X, y, feature_names, layout, model_type, is_classification, optimization_goal,
+                                   current_app.config['TRAINING_CV_JOBS'], incremental, on_success=on_success,
+                                   store=lambda result: {'recommendations': result[3], 'evaluation': result[4]})
             
-            conn.close()
-            return render_template('model_results.html', 
-                                  target_habit=target_habit,
-                                  recommendations=recommendations,
-                                  optimization_goal=optimization_goal)
+            return redirect(url_for('model_job', job_id=job.id))
+        except training_jobs.JobLimitError as e:
+            flash(str(e))
+            return redirect(url_for('models'))
         except Exception as e:
             flash(f"Error training model: {str(e)}")
-            conn.close()
             return redirect(url_for('models'))
     
-    conn.close()
     return render_template('models.html', target_habits=target_habits, feature_habits=feature_habits)
 
-@app.route('/optimize_schedule', methods=['GET', 'POST'])
+@route('/models/jobs/<job_id>')
+@login_required
+def model_job(job_id):
+    job = training_jobs.get_queue().get(job_id, session['user_id'])
+    if job is None:
+        flash('Model training job not found')
+        return redirect(url_for('models'))
+    
+    recommendations = job.result['recommendations'] if job.status == 'done' else None
+    evaluation = job.result['evaluation'] if job.status == 'done' else None
+    return render_template('model_results.html',
+                           job=job.to_dict(),
+                           target_habit=job.context['target_habit'],
+                           recommendations=recommendations,
+                           evaluation=evaluation,
+                           optimization_goal=job.context['optimization_goal'])
+
+@route('/models/jobs/<job_id>/status')
+@login_required
+def model_job_status(job_id):
+    job = training_jobs.get_queue().get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(job.to_dict())
+
+@route('/models/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_model_job(job_id):
+    job = training_jobs.get_queue().cancel(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(job.to_dict())
+
+@route('/optimize_schedule', methods=['GET', 'POST'])
 @login_required
 def optimize_schedule():
-    conn = get_db_connection()
+    conn = get_db()
     habits = conn.execute('SELECT * FROM habits WHERE user_id = ?', (session['user_id'],)).fetchall()
     
     if request.method == 'POST':
-        target_habit_id = request.form['target_habit']
+        target_habit_id = int(request.form['target_habit'])
+        optimization_goal = request.form.get('optimization_goal', 'maximize')
         constraints = {}
+        time_units = {}
         
-        # Collect constraints for each habit
+        # Collect constraints for each habit; categorical habits aren't part of the schedule
         for habit in habits:
             habit_id = habit['id']
+            if habit['variable_type'] not in ('numeric', 'boolean'):
+                continue
             min_key = f'min_{habit_id}'
             max_key = f'max_{habit_id}'
             
@@ -401,142 +589,156 @@ def optimize_schedule():
                 if habit_id not in constraints:
                     constraints[habit_id] = {}
                 constraints[habit_id]['max'] = float(request.form[max_key])
+            
+            # Habits measured in minutes or hours share the 24 hour day
+            if request.form.get(f'unit_{habit_id}') in ('minutes', 'hours'):
+                time_units[habit_id] = request.form[f'unit_{habit_id}']
+        
+        target_habit = next((h for h in habits if h['id'] == target_habit_id), None)
+        if target_habit is None:
+            flash('Target habit not found')
+            return redirect(url_for('optimize_schedule'))
         
-        # Generate optimized schedule
-        schedule = ml_utils.generate_optimized_schedule(target_habit_id, constraints, habits)
+        # Every other numeric/boolean habit with data is something the schedule can set
+        logged = {row['habit_id'] for row in conn.execute('''
+            SELECT DISTINCT e.habit_id FROM entries e
+            JOIN habits h ON h.id = e.habit_id
+            WHERE h.user_id = ? AND e.num_value IS NOT NULL
+        ''', (session['user_id'],))}
+        feature_habits = [h for h in habits
+                          if h['id'] != target_habit_id and h['id'] in logged
+                          and h['variable_type'] in ('numeric', 'boolean')]
+        feature_habit_ids = [h['id'] for h in feature_habits]
+        
+        try:
+            import ml_utils
+            import training_data
+            
+            with metrics.span('load_training_matrix'):
+                X, y, feature_names, layout = training_data.load_training_matrix(conn, target_habit_id, feature_habit_ids)
+            is_classification = target_habit['variable_type'] == 'boolean'
+            
+            # Model the target from the other habits, reusing a cached model when possible
+            cache = model_cache.get_cache()
+            cache_key = model_cache.training_key(conn, target_habit_id, feature_habit_ids, 'random_forest',
+                                                 split='chronological')
+            cached = cache.get(cache_key)
+            if cached is not None:
+                model, scaler, feature_names, accuracy, evaluation = cached
+            else:
+                # Skips walk-forward validation to keep this request quick
+                with metrics.span('train_model'):
+                    model, scaler, X_test, y_test, accuracy = ml_utils.train_model(X, y, 'random_forest',
+                                                                                   is_classification)
+                cache.put(cache_key, (model, scaler, feature_names, accuracy, None))
+            
+            # Generate optimized schedule
+            with metrics.span('generate_optimized_schedule'):
+                schedule = ml_utils.generate_optimized_schedule(target_habit, feature_habits, X, model, scaler,
+                                                                constraints, is_classification, optimization_goal,
+                                                                time_units=time_units)
+        except Exception as e:
+            flash(f"Error optimizing schedule: {str(e)}")
+            return redirect(url_for('optimize_schedule'))
         
-        conn.close()
         return render_template('optimized_schedule.html', schedule=schedule)
     
-    conn.close()
     return render_template('optimize_schedule.html', habits=habits)
 
-@app.route('/generate_plot', methods=['POST'])
+@route('/generate_plot', methods=['POST'])
 @login_required
 def generate_plot():
     habit_id = request.form['habit_id']
-    start_date = request.form['start_date']
-    end_date = request.form['end_date']
-    
-    conn = get_db_connection()
-    habit = conn.execute('SELECT variable_type FROM habits WHERE id = ?', (habit_id,)).fetchone()
-    if habit['variable_type'] == 'numeric':
-        entries = conn.execute('''
-            SELECT date, value FROM entries 
-            WHERE habit_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date
-        ''', (habit_id, start_date, end_date)).fetchall()
-        dates = [entry['date'] for entry in entries]
-        values = [float(entry['value']) for entry in entries]
-        
-        data = [{
-            'x': dates,
-            'y': values,
-            'type': 'scatter'
-        }]
-        
-        layout = {
-            'title': 'Habit Progress',
-            'xaxis': {'title': 'Date'},
-            'yaxis': {'title': 'Value'}
-        }
-    elif habit['variable_type'] == 'boolean':
-        entries = conn.execute('''
-            SELECT date, value FROM entries 
-            WHERE habit_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date
-        ''', (habit_id, start_date, end_date)).fetchall()
-        dates = [entry['date'] for entry in entries]
-        values = [int(entry['value']) for entry in entries]
-        
-        data = [{
-            'x': dates,
-            'y': values,
-            'type': 'bar'
-        }]
-        
-        layout = {
-            'title': 'Habit Progress',
-            'xaxis': {'title': 'Date'},
-            'yaxis': {'title': 'Yes/No'}
-        }
-    elif habit['variable_type'] == 'categorical':
-        entries = conn.execute('''
-            SELECT date, value FROM entries 
-            WHERE habit_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date
-        ''', (habit_id, start_date, end_date)).fetchall()
-        dates = [entry['date'] for entry in entries]
-        values = [entry['value'] for entry in entries]
-        
-        data = [{
-            'x': dates,
-            'y': values,
-            'type': 'bar'
-        }]
-        
-        layout = {
-            'title': 'Habit Progress',
-            'xaxis': {'title': 'Date'},
-            'yaxis': {'title': 'Category'}
-        }
+    start_date = request.form.get('start_date')
+    end_date = request.form.get('end_date')
+    
+    import plot_data
     
-    conn.close()
+    try:
+        plot_data.validate_range(start_date, end_date)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
     
-    return jsonify({'data': data, 'layout': layout})
+    conn = get_db()
+    habit = conn.execute('SELECT id, variable_type FROM habits WHERE id = ? AND user_id = ?',
+                         (habit_id, session['user_id'])).fetchone()
+    if habit is None:
+        return jsonify({'error': 'Habit not found'}), 404
+    
+    # Bucketed and downsampled server side so the payload stays small
+    return jsonify(plot_data.build_plot(conn, habit, start_date, end_date))
 
-@app.route('/habit/<int:habit_id>')
+@route('/habit/<int:habit_id>')
 @login_required
 def view_habit(habit_id):
-    conn = get_db_connection()
+    conn = get_db()
     habit = conn.execute('SELECT * FROM habits WHERE id = ? AND user_id = ?', 
                          (habit_id, session['user_id'])).fetchone()
-    entries = conn.execute('SELECT * FROM entries WHERE habit_id = ? ORDER BY date DESC', (habit_id,)).fetchall()
+    entries, next_cursor = entry_page_or_first(conn, habit_id)
     
     habit_options = []
     if habit['variable_type'] == 'categorical':
         options = conn.execute('SELECT option_value FROM habit_options WHERE habit_id = ?', (habit_id,)).fetchall()
         habit_options = [option['option_value'] for option in options]
     
-    conn.close()
-    return render_template('view_habit.html', habit=habit, entries=entries, habit_options=habit_options)
+    return render_template('view_habit.html', habit=habit, entries=entries, habit_options=habit_options,
+                           next_cursor=next_cursor)
 
-@app.route('/entry/<int:entry_id>/edit', methods=['GET', 'POST'])
+@route('/habit/<int:habit_id>/entries.json')
+@login_required
+def habit_entries_json(habit_id):
+    # Keyset-paginated entries for infinite scroll
+    conn = get_db()
+    habit = conn.execute('SELECT id FROM habits WHERE id = ? AND user_id = ?', 
+                         (habit_id, session['user_id'])).fetchone()
+    if habit is None:
+        return jsonify({'error': 'Habit not found'}), 404
+    limit = min(max(request.args.get('limit', entry_store.ENTRY_PAGE_SIZE, type=int), 1), 500)
+    try:
+        entries, next_cursor = entry_store.entry_page(conn, habit_id, request.args.get('before'), limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({
+        'entries': [{'id': entry['id'], 'date': entry['date'], 'value': entry['value'],
+                     'edit_url': url_for('edit_entry', entry_id=entry['id']),
+                     'delete_url': url_for('delete_entry', entry_id=entry['id'])} for entry in entries],
+        'next': next_cursor,
+    })
+
+@route('/entry/<int:entry_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_entry(entry_id):
-    conn = get_db_connection()
+    conn = get_db()
     entry = conn.execute('SELECT * FROM entries WHERE id = ?', (entry_id,)).fetchone()
     habit = conn.execute('SELECT * FROM habits WHERE id = ? AND user_id = ?', 
                          (entry['habit_id'], session['user_id'])).fetchone()
     
     if request.method == 'POST':
         value = request.form['value']
-        conn.execute('UPDATE entries SET value = ? WHERE id = ?', (value, entry_id))
-        conn.commit()
+        with conn:
+            entry_store.update_entry_value(conn, entry_id, entry['habit_id'], value)
         flash('Entry updated successfully')
         return redirect(url_for('view_habit', habit_id=habit['id']))
     
-    conn.close()
     return render_template('edit_entry.html', entry=entry, habit=habit)
 
-@app.route('/entry/<int:entry_id>/delete', methods=['POST'])
+@route('/entry/<int:entry_id>/delete', methods=['POST'])
 @login_required
 def delete_entry(entry_id):
-    conn = get_db_connection()
+    conn = get_db()
     entry = conn.execute('SELECT * FROM entries WHERE id = ?', (entry_id,)).fetchone()
     habit = conn.execute('SELECT * FROM habits WHERE id = ? AND user_id = ?', 
                          (entry['habit_id'], session['user_id'])).fetchone()
     
-    conn.execute('DELETE FROM entries WHERE id = ?', (entry_id,))
-    conn.commit()
-    conn.close()
+    with conn:
+        entry_store.delete_entry(conn, entry_id, entry['habit_id'])
     flash('Entry deleted successfully')
     return redirect(url_for('view_habit', habit_id=habit['id']))
 
-@app.route('/habit/<int:habit_id>/edit', methods=['GET', 'POST'])
+@route('/habit/<int:habit_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_habit(habit_id):
-    conn = get_db_connection()
+    conn = get_db()
     habit = conn.execute('SELECT * FROM habits WHERE id = ? AND user_id = ?', 
                          (habit_id, session['user_id'])).fetchone()
     board = conn.execute('SELECT * FROM habit_boards WHERE id = ?', (habit['board_id'],)).fetchone()
@@ -561,6 +763,8 @@ def edit_habit(habit_id):
                 if option.strip():
                     conn.execute('INSERT INTO habit_options (habit_id, option_value) VALUES (?, ?)',
                                  (habit_id, option.strip()))
+            # Option ids changed, so re-point existing entries at them
+            entry_store.relink_options(conn, habit_id)
 
         conn.commit()
         flash('Habit updated successfully')
@@ -573,19 +777,19 @@ def edit_habit(habit_id):
                               (habit_id,)).fetchall()
         options = [option['option_value'] for option in options]
 
-    conn.close()
     return render_template('edit_habit.html', habit=habit, board=board, options=options)
 
-@app.route('/habit/<int:habit_id>/delete', methods=['POST'])
+@route('/habit/<int:habit_id>/delete', methods=['POST'])
 @login_required
 def delete_habit(habit_id):
-    conn = get_db_connection()
+    conn = get_db()
     habit = conn.execute('SELECT board_id FROM habits WHERE id = ? AND user_id = ?', 
                          (habit_id, session['user_id'])).fetchone()
     
     if habit:
         # Delete related entries and options first
         conn.execute('DELETE FROM entries WHERE habit_id = ?', (habit_id,))
+        conn.execute('DELETE FROM habit_rollups WHERE habit_id = ?', (habit_id,))
         conn.execute('DELETE FROM habit_options WHERE habit_id = ?', (habit_id,))
         # Then delete the habit
         conn.execute('DELETE FROM habits WHERE id = ?', (habit_id,))
@@ -594,8 +798,37 @@ def delete_habit(habit_id):
     else:
         flash('Habit not found or unauthorized')
     
-    conn.close()
     return redirect(url_for('view_board', board_id=habit['board_id']))
 
+def component_stats():
+    # Connection pool, cache and training queue counters for monitoring;
+    # counts only, no file paths
+    return {'pool': db.get_pool().stats(),
+            'model_cache': model_cache.get_cache().stats(),
+            'training_jobs': training_jobs.get_queue().stats(),
+            'correlations': correlations.get_cache().stats(),
+            'features': features.get_cache().stats(),
+            'page_cache': page_cache.get_cache().stats() if page_cache.get_cache() else {}}
+
+@route('/db/stats')
+@login_required
+def db_stats():
+    return jsonify(component_stats())
+
+@route('/metrics')
+def prometheus_metrics():
+    # Route latency, per-request SQL and span histograms plus the counters
+    # above, in Prometheus text format
+    if not metrics.scrape_allowed():
+        return 'Forbidden', 403
+    return Response(metrics.get_metrics().render(component_stats()),
+                    mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+    # Werkzeug's development server, with the debugger and reloader unless
+    # HABITS_DEBUG=0. For production use a WSGI server with wsgi.py.
+    debug = os.environ.get('HABITS_DEBUG', '1') == '1'
+    overrides = {}
+    if debug and not os.environ.get('HABITS_SECRET_KEY'):
+        overrides['SECRET_KEY'] = 'dev'  # Stable across reloader restarts
+    create_app(overrides).run(debug=debug, host='0.0.0.0')
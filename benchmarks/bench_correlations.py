@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import correlations
+
+
+def synthetic_values(n_habits, n_days, missing=0.3, seed=0):
+    """Correlated daily habit values with a fraction of days left unlogged."""
+    rng = np.random.default_rng(seed)
+    latent = rng.normal(size=(n_days, 5))
+    values = latent @ rng.normal(size=(5, n_habits)) + rng.normal(size=(n_days, n_habits))
+    values[rng.random(values.shape) < missing] = np.nan
+    return values
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the correlation matrix against pandas DataFrame.corr.')
+    parser.add_argument('--habits', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"habits":>6} {"pandas (s)":>11} {"numpy (s)":>10} {"speedup":>8} {"max diff":>9}')
+    for n_habits in args.habits:
+        values = synthetic_values(n_habits, args.years * 365)
+        frame = pd.DataFrame(values)
+
+        expected = frame.corr(min_periods=10).to_numpy()
+        actual, _ = correlations.pairwise_pearson(values, values)
+        diff = np.nanmax(np.abs(expected - actual))
+
+        pandas_time = best_of(lambda: frame.corr(min_periods=10), args.repeat)
+        numpy_time = best_of(lambda: correlations.pairwise_pearson(values, values), args.repeat)
+        print(f'{n_habits:>6} {pandas_time:>11.4f} {numpy_time:>10.4f} {pandas_time / numpy_time:>7.1f}x {diff:>9.2e}')
+
+    values = synthetic_values(100, args.years * 365)
+    habits = [{'id': i, 'name': f'habit_{i}', 'type': 'numeric'} for i in range(100)]
+    report_time = best_of(lambda: correlations.correlation_report(habits, values, max_lag=7), args.repeat)
+    print(f'Full report (Pearson, Spearman, 7 lags) for 100 habits: {report_time:.3f}s')
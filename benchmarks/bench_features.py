@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import features
+
+OPTIONS = {'lags': [1, 2, 7], 'windows': [7, 28], 'stats': ['mean', 'sum', 'std'],
+           'day_of_week': True, 'streaks': True}
+
+
+def synthetic_habit(n_days, missing=0.3, seed=0):
+    """A habit logged on roughly 70% of n_days consecutive days."""
+    rng = np.random.default_rng(seed)
+    days = np.arange(n_days)[rng.random(n_days) >= missing]
+    dates = np.datetime64('2020-01-01') + days
+    values = np.round(rng.gamma(2.0, 30.0, len(days))) * (rng.random(len(days)) > 0.2)
+    return dates, values
+
+
+def row_by_row(dates, values, options):
+    """The same features built with a Python loop over calendar days."""
+    logged = dict(zip(dates.astype(str), values))
+    calendar = [str(day) for day in np.arange(dates[0], dates[-1] + 1)]
+    rows, streak = [], 0
+    for i, day in enumerate(calendar):
+        row = {}
+        for lag in options['lags']:
+            row[f'lag {lag}'] = logged.get(calendar[i - lag]) if i >= lag else None
+        for window in options['windows']:
+            window_values = [logged[d] for d in calendar[max(0, i - window + 1):i + 1] if d in logged]
+            row[f'{window} mean'] = np.mean(window_values) if window_values else None
+            row[f'{window} sum'] = sum(window_values) if window_values else None
+            row[f'{window} std'] = np.std(window_values, ddof=1) if len(window_values) > 1 else None
+        streak = streak + 1 if logged.get(day, 0) != 0 else 0
+        row['streak'] = streak
+        rows.append(row)
+    return rows
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time derived feature generation for one habit.')
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 3, 10])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"days":>6} {"loop (s)":>9} {"pandas (s)":>11} {"speedup":>8} {"cached (s)":>11}')
+    for years in args.years:
+        dates, values = synthetic_habit(years * 365)
+        habit = {'id': 1, 'data_version': 1, 'name': 'Exercise'}
+        cache = features.FeatureCache()
+        loop = best_of(lambda: row_by_row(dates, values, OPTIONS), args.repeat)
+        vectorized = best_of(lambda: features.habit_features(dates, values, 'Exercise', OPTIONS), args.repeat)
+        cache.get(habit, dates, values, OPTIONS)
+        cached = best_of(lambda: cache.get(habit, dates, values, OPTIONS), args.repeat)
+        print(f'{years * 365:>6} {loop:>9.4f} {vectorized:>11.4f} {loop / vectorized:>7.0f}x {cached:>11.6f}')
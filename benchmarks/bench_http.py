@@ -0,0 +1,136 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+from http.cookiejar import CookieJar
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import results
+import seed
+from bench_web import load_users, random_value
+
+# Load test of a running server over HTTP, for comparing the dev server with
+# a multi-process WSGI server. Start the server on a database made by
+# seed.py, then point this at it with the same database so it knows the
+# users' boards and habits:
+#
+#   python benchmarks/seed.py /tmp/bench.db
+#   HABITS_DATABASE=/tmp/bench.db HABITS_SECRET_KEY=x gunicorn --preload -w 4 wsgi:app
+#   python benchmarks/bench_http.py http://127.0.0.1:8000 /tmp/bench.db
+#
+# Every client thread logs in as its own user and opens a new connection
+# per request, as neither server keeps connections alive.
+
+
+def page_scenarios(user, rng, days):
+    board = f"/board/{user['board_id']}"
+    return {
+        'index': lambda: ('/', None),
+        'view_board': lambda: (board, None),
+        'view_habit': lambda: (f"/habit/{rng.choice(user['habits'])}", None),
+        'log_all_get': lambda: (f'{board}/log_all', None),
+        'log_all_post': lambda: (f'{board}/log_all', dict(
+            {'log_date': rng.choice(days)},
+            **{f"habit_{habit['id']}": random_value(user, habit, rng) for habit in user['board_habits']})),
+    }
+
+
+SCENARIOS = ['index', 'view_board', 'view_habit', 'log_all_get', 'log_all_post']
+
+
+def login(base_url, username):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    data = urllib.parse.urlencode({'username': username, 'password': seed.PASSWORD}).encode()
+    opener.open(f'{base_url}/login', data).read()
+    return opener
+
+
+def run_scenario(base_url, users, name, threads, seconds, days, seed_value=0):
+    latencies = [[] for _ in range(threads)]
+    errors = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+
+    def worker(i):
+        user = users[i % len(users)]
+        opener = login(base_url, user['username'])
+        next_request = page_scenarios(user, random.Random(seed_value + i), days)[name]
+        barrier.wait()
+        while not stop.is_set():
+            path, form = next_request()
+            data = urllib.parse.urlencode(form).encode() if form else None
+            start = time.perf_counter()
+            try:
+                with opener.open(base_url + path, data) as response:
+                    response.read()
+            except urllib.error.URLError:
+                errors[i] += 1
+            latencies[i].append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = sorted(value for values in latencies for value in values)
+    return {
+        'requests': len(all_latencies),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'req_per_sec': round(len(all_latencies) / elapsed, 1),
+        'p50_ms': round(results.percentile(all_latencies, 0.5) * 1000, 2),
+        'p95_ms': round(results.percentile(all_latencies, 0.95) * 1000, 2),
+        'p99_ms': round(results.percentile(all_latencies, 0.99) * 1000, 2),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test a running server over HTTP.')
+    parser.add_argument('url', help='server address, e.g. http://127.0.0.1:8000')
+    parser.add_argument('database', help='the seeded database the server is using')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--label', default='server', help='prefix for the metric names')
+    parser.add_argument('--json', default='bench_http.json', help='where to write the results')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    conn.row_factory = sqlite3.Row
+    users = load_users(conn, args.users)
+    for user in users:
+        user['username'] = conn.execute('SELECT username FROM users WHERE id = ?', (user['id'],)).fetchone()[0]
+    n_days = conn.execute('SELECT julianday(max(date)) - julianday(min(date)) FROM entries').fetchone()[0] or 0
+    conn.close()
+    days = [(date.today() - timedelta(days=i)).isoformat() for i in range(int(n_days) + 1)]
+    base_url = args.url.rstrip('/')
+
+    print(f'{"scenario":<14} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    scenarios = {}
+    for name in args.scenarios:
+        result = run_scenario(base_url, users, name, args.threads, args.seconds, days)
+        scenarios[name] = result
+        print(f"{name:<14} {result['req_per_sec']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['errors']:>7}")
+
+    metrics = {}
+    for name, result in scenarios.items():
+        for key in ('req_per_sec', 'p50_ms', 'p95_ms', 'p99_ms'):
+            metrics[f'http.{args.label}.{name}.{key}'] = result[key]
+    path = os.path.abspath(args.json)
+    results.write_results(path, 'http', dict(vars(args), json=None), metrics, {'scenarios': scenarios})
+    print(f'results written to {path}')
@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ml_utils
+import results
+from bench_preprocess import synthetic_data
+
+# Micro-benchmarks of the model pipeline across history lengths and feature
+# counts: preprocess_data, train_model for each model type, walk-forward
+# validation and generate_recommendations. Each is timed best-of --repeat.
+# update_model is timed adding one new day to an incremental model trained
+# on all the others, next to retraining that model on every day.
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def time_update(X, y, model_type, repeat):
+    timings = []
+    trained_rows = len(X) - 1
+    for _ in range(repeat):
+        # Fully trained on every day but the last, which is then the new one
+        model, scaler, _, _, _ = ml_utils.train_model(X.iloc[:trained_rows], y.iloc[:trained_rows],
+                                                      model_type, incremental=True)
+        state = ml_utils.incremental_state(X.iloc[:trained_rows], y.iloc[:trained_rows], trained_rows)
+        start = time.perf_counter()
+        ml_utils.update_model(model, scaler, X, y, state)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_size(n_days, n_features, model_types, repeat, n_jobs):
+    data = synthetic_data(n_features, n_days)
+    X, y, feature_names = ml_utils.preprocess_data(data)
+    timings = {'preprocess_data': best_of(lambda: ml_utils.preprocess_data(data), repeat)}
+    for model_type in model_types:
+        timings[f'train_model.{model_type}'] = best_of(
+            lambda: ml_utils.train_model(X, y, model_type), repeat)
+    for model_type in model_types:
+        if model_type in ml_utils.INCREMENTAL_MODEL_TYPES:
+            timings[f'train_model.{model_type}.incremental'] = best_of(
+                lambda: ml_utils.train_model(X, y, model_type, incremental=True), repeat)
+            timings[f'update_model.{model_type}'] = time_update(X, y, model_type, repeat)
+    timings['walk_forward_validate'] = best_of(
+        lambda: ml_utils.walk_forward_validate(X, y, model_types, n_jobs=n_jobs), repeat)
+    model, scaler, _, _, _ = ml_utils.train_model(X, y, 'random_forest')
+    timings['generate_recommendations'] = best_of(
+        lambda: ml_utils.generate_recommendations(X, model, scaler, feature_names, 'maximize'), repeat)
+    return X.shape[1], timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the model training pipeline across data sizes.')
+    parser.add_argument('--days', type=int, nargs='+', default=[180, 730, 1825])
+    parser.add_argument('--features', type=int, nargs='+', default=[5, 20])
+    parser.add_argument('--model-types', nargs='+', choices=ml_utils.MODEL_TYPES, default=list(ml_utils.MODEL_TYPES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=1, help='threads for walk-forward validation')
+    parser.add_argument('--json', default='bench_ml.json', help='where to write the results')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')  # sklearn feature-name warnings
+
+    metrics = {}
+    details = []
+    for n_days in args.days:
+        for n_features in args.features:
+            n_columns, timings = bench_size(n_days, n_features, args.model_types, args.repeat, args.jobs)
+            details.append({'days': n_days, 'features': n_features, 'columns': n_columns,
+                            'seconds': {name: round(seconds, 5) for name, seconds in timings.items()}})
+            print(f'{n_days} days x {n_features} habits ({n_columns} columns)')
+            for name, seconds in timings.items():
+                metrics[f'ml.{name}.{n_days}x{n_features}_s'] = round(seconds, 5)
+                print(f'  {name:<40} {seconds * 1000:>10.1f} ms')
+
+    path = os.path.abspath(args.json)
+    results.write_results(path, 'ml', dict(vars(args), json=None), metrics, {'sizes': details})
+    print(f'results written to {path}')
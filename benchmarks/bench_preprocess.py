@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ml_utils
+
+
+def legacy_preprocess_data(data):
+    # The merge-per-column implementation preprocess_data replaced, kept here
+    # as the baseline for timing and as a reference for the output
+    target_df = pd.DataFrame({'date': data['target']['dates'], 'target': data['target']['values']})
+    feature_dfs = []
+    for feature in data['features']:
+        if feature['type'] == 'categorical':
+            for i, val in enumerate(feature['categories']):
+                col_name = f"{feature['name']}_{val}"
+                feature_dfs.append(pd.DataFrame({'date': feature['dates'],
+                                                 col_name: [values[i] for values in feature['values']]}))
+        else:
+            feature_dfs.append(pd.DataFrame({'date': feature['dates'], feature['name']: feature['values']}))
+    merged_df = target_df
+    for df in feature_dfs:
+        merged_df = pd.merge(merged_df, df, on='date', how='outer')
+    merged_df = merged_df.ffill().bfill()
+    return merged_df.drop(['date', 'target'], axis=1), merged_df['target']
+
+
+def synthetic_data(n_features, n_days, seed=0):
+    """Daily series with ~10% of days missing per habit and every fourth habit categorical."""
+    rng = np.random.default_rng(seed)
+    start = date(2020, 1, 1)
+    all_dates = [(start + timedelta(days=i)).isoformat() for i in range(n_days)]
+
+    def sample_dates():
+        keep = rng.random(n_days) > 0.1
+        return [d for d, k in zip(all_dates, keep) if k]
+
+    target_dates = sample_dates()
+    data = {'target': {'name': 'target', 'dates': target_dates, 'values': rng.normal(size=len(target_dates)).tolist()},
+            'features': []}
+    for i in range(n_features):
+        dates = sample_dates()
+        if i % 4 == 3:
+            categories = ['a', 'b', 'c']
+            codes = rng.integers(0, 3, size=len(dates))
+            values = [[1 if code == k else 0 for k in range(3)] for code in codes]
+            data['features'].append({'name': f'habit_{i}', 'type': 'categorical', 'categories': categories,
+                                     'dates': dates, 'values': values})
+        else:
+            data['features'].append({'name': f'habit_{i}', 'type': 'numeric',
+                                     'dates': dates, 'values': rng.normal(size=len(dates)).tolist()})
+    return data
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time preprocess_data against the legacy merge loop.')
+    parser.add_argument('--features', type=int, nargs='+', default=[10, 25, 50, 100])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    n_days = args.years * 365
+    print(f'{"features":>8} {"columns":>8} {"legacy (s)":>11} {"new (s)":>9} {"speedup":>8}')
+    for n_features in args.features:
+        data = synthetic_data(n_features, n_days)
+        X, y, _ = ml_utils.preprocess_data(data)
+        X_legacy, y_legacy = legacy_preprocess_data(data)
+        np.testing.assert_allclose(X.to_numpy(dtype=float), X_legacy.to_numpy(dtype=float))
+        np.testing.assert_allclose(y.to_numpy(dtype=float), y_legacy.to_numpy(dtype=float))
+
+        legacy = best_of(lambda: legacy_preprocess_data(data), args.repeat)
+        new = best_of(lambda: ml_utils.preprocess_data(data), args.repeat)
+        print(f'{n_features:>8} {X.shape[1]:>8} {legacy:>11.4f} {new:>9.4f} {legacy / new:>7.1f}x')
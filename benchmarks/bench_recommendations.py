@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ml_utils
+import search
+
+
+def synthetic_problem(n_numeric, n_categorical, n_rows=730, seed=0):
+    """
+    Random training data where the target peaks at an interior point of the
+    numeric features and depends on which category is active, so a good
+    search has to find both.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    layout = []
+    optimum = rng.uniform(0.2, 0.8, size=n_numeric)
+    target = np.zeros(n_rows)
+    for i in range(n_numeric):
+        values = rng.uniform(0, 1, size=n_rows)
+        columns[f'numeric_{i}'] = values
+        layout.append({'habit_id': i, 'name': f'numeric_{i}', 'type': 'numeric', 'columns': [len(layout)]})
+        target -= (values - optimum[i]) ** 2
+    col = n_numeric
+    for j in range(n_categorical):
+        codes = rng.integers(0, 4, size=n_rows)
+        effects = rng.normal(size=4)
+        names = []
+        for k in range(4):
+            columns[f'categorical_{j}_{k}'] = (codes == k).astype(float)
+            names.append(k)
+        layout.append({'habit_id': n_numeric + j, 'name': f'categorical_{j}', 'type': 'categorical',
+                       'columns': list(range(col, col + 4)), 'categories': names})
+        col += 4
+        target += 0.1 * effects[codes]
+    X = pd.DataFrame(columns)
+    y = pd.Series(target + rng.normal(scale=0.01, size=n_rows))
+    return X, y, layout
+
+
+def run(X, model, scaler, layout, backend, budget, seed):
+    space = search.SearchSpace(X, layout)
+    objective = lambda rows: ml_utils.predict_target(model, scaler, rows)
+    start = time.perf_counter()
+    _, best = search.SEARCH_BACKENDS[backend](space, objective, budget, seed=seed)
+    return best, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare recommendation search backends on a trained model.')
+    parser.add_argument('--numeric', type=int, nargs='+', default=[2, 8, 20])
+    parser.add_argument('--categorical', type=int, default=2)
+    parser.add_argument('--budget', type=int, default=1000)
+    parser.add_argument('--seeds', type=int, default=5)
+    parser.add_argument('--model', default='random_forest')
+    args = parser.parse_args()
+
+    print(f'{"dims":>5} {"backend":>8} {"evals":>6} {"best (mean)":>12} {"time (s)":>9}')
+    for n_numeric in args.numeric:
+        X, y, layout = synthetic_problem(n_numeric, args.categorical)
+        model, scaler, _, _, _ = ml_utils.train_model(X, y, args.model)
+        for backend in ('lhs', 'sobol', 'random'):
+            results = [run(X, model, scaler, layout, backend, args.budget, seed) for seed in range(args.seeds)]
+            best = np.mean([r[0] for r in results])
+            elapsed = np.mean([r[1] for r in results])
+            print(f'{n_numeric + args.categorical:>5} {backend:>8} {args.budget:>6} {best:>12.4f} {elapsed:>9.3f}')
+
+        # Give random search the same wall time the space-filling search used
+        lhs_time = np.mean([run(X, model, scaler, layout, 'lhs', args.budget, seed)[1] for seed in range(args.seeds)])
+        budget = args.budget
+        while run(X, model, scaler, layout, 'random', budget * 2, 0)[1] <= lhs_time:
+            budget *= 2
+        results = [run(X, model, scaler, layout, 'random', budget, seed) for seed in range(args.seeds)]
+        print(f'{n_numeric + args.categorical:>5} {"random=t":>8} {budget:>6} '
+              f'{np.mean([r[0] for r in results]):>12.4f} {np.mean([r[1] for r in results]):>9.3f}')
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['numpy', 'pandas', 'scipy', 'sklearn', 'joblib', 'pyarrow']
+
+# Runs in a fresh interpreter: import the app as a web worker would, then
+# load the ML stack as the first /models request would, reporting the time
+# and peak RSS after each step
+PROBE = '''
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import app
+app.create_app()
+boot = time.perf_counter() - start
+boot_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+loaded = [name for name in {heavy!r} if name in sys.modules]
+start = time.perf_counter()
+import ml_utils, training_data
+ml = time.perf_counter() - start
+ml_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'boot': boot, 'boot_rss_mb': boot_rss / 1024, 'loaded': loaded,
+                   'ml_import': ml, 'ml_rss_mb': ml_rss / 1024}}))
+'''
+
+
+def probe(workdir):
+    env = dict(os.environ, HABITS_DATABASE=os.path.join(workdir, 'habits.db'),
+               HABITS_MODEL_CACHE_DIR=os.path.join(workdir, 'model_cache'), HABITS_SECRET_KEY='benchmark')
+    output = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT, heavy=HEAVY_MODULES)],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure web worker startup time and memory.')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # Work on a copy so the app's startup migrations never touch habits.db
+    workdir = tempfile.mkdtemp()
+    shutil.copy(os.path.join(ROOT, 'habits.db'), workdir)
+    try:
+        probe(workdir)  # Warm the OS file cache and apply migrations
+        results = [probe(workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f'create_app():        {statistics.median(r["boot"] for r in results):.3f}s '
+          f'(median of {args.runs}), peak RSS {statistics.median(r["boot_rss_mb"] for r in results):.1f} MB')
+    print(f'heavy modules loaded: {", ".join(results[0]["loaded"]) or "none"}')
+    print(f'first ML use:        +{statistics.median(r["ml_import"] for r in results):.3f}s, '
+          f'peak RSS {statistics.median(r["ml_rss_mb"] for r in results):.1f} MB')
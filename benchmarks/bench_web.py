@@ -0,0 +1,223 @@
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import results
+import seed
+
+# Load test of the main pages through Flask's test client. Each scenario is
+# run on its own by --threads threads, each logged in as a different
+# synthetic user and issuing --requests requests back to back. This
+# measures the app itself (routing, SQL, templates, the GIL and SQLite
+# locking) without an HTTP server or network in the way.
+#
+# /models POST is measured once every user's model is trained and cached,
+# so it times loading the training matrix and generating recommendations,
+# not the background training job.
+
+SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+# Most SQL statements a request may run, whatever the number of habits on
+# the board. The script exits with status 1 if a scenario goes over.
+QUERY_BUDGETS = {
+    'log_all_post': 10,
+}
+
+
+def load_users(conn, n_users):
+    users = []
+    for user in conn.execute('SELECT id FROM users ORDER BY id LIMIT ?', (n_users,)).fetchall():
+        habits = conn.execute('SELECT id, board_id, variable_type FROM habits WHERE user_id = ? ORDER BY id',
+                              (user['id'],)).fetchall()
+        options = {row['habit_id']: row['values'].split(',') for row in conn.execute(
+            "SELECT habit_id, group_concat(option_value) AS 'values' FROM habit_options "
+            "WHERE habit_id IN (SELECT id FROM habits WHERE user_id = ?) GROUP BY habit_id", (user['id'],))}
+        board_id = habits[0]['board_id']
+        board = [dict(habit) for habit in habits if habit['board_id'] == board_id]
+        target = next(habit for habit in board if habit['variable_type'] == 'numeric')
+        users.append({
+            'id': user['id'],
+            'board_id': board_id,
+            'habits': [habit['id'] for habit in habits],
+            'board_habits': board,
+            'options': options,
+            'model_form': {'target_habit': target['id'], 'optimization_goal': 'maximize',
+                           'model_type': 'random_forest',
+                           'feature_habits': [habit['id'] for habit in board if habit['id'] != target['id']]},
+        })
+    return users
+
+
+def random_value(user, habit, rng):
+    if habit['variable_type'] == 'categorical':
+        return rng.choice(user['options'][habit['id']])
+    if habit['variable_type'] == 'boolean':
+        return rng.choice(['0', '1'])
+    return str(rng.randint(0, 180))
+
+
+def log_all_post(client, user, rng, days):
+    form = {'log_date': rng.choice(days)}
+    for habit in user['board_habits']:
+        form[f"habit_{habit['id']}"] = random_value(user, habit, rng)
+    return client.post(f"/board/{user['board_id']}/log_all", data=form)
+
+
+# name -> (request function, expected status)
+SCENARIOS = {
+    'index': (lambda client, user, rng, days: client.get('/'), 200),
+    'view_board': (lambda client, user, rng, days: client.get(f"/board/{user['board_id']}"), 200),
+    'log_all_get': (lambda client, user, rng, days: client.get(f"/board/{user['board_id']}/log_all"), 200),
+    'log_all_post': (log_all_post, 302),
+    'view_habit': (lambda client, user, rng, days: client.get(f"/habit/{rng.choice(user['habits'])}"), 200),
+    'generate_plot': (lambda client, user, rng, days: client.post(
+        '/generate_plot', data={'habit_id': rng.choice(user['habits'])}), 200),
+    'models_get': (lambda client, user, rng, days: client.get('/models'), 200),
+    'models_post': (lambda client, user, rng, days: client.post('/models', data=user['model_form']), 302),
+}
+
+
+def logged_in_client(flask_app, user):
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user['id']
+    return client
+
+
+def train_models(flask_app, users, timeout=600):
+    """Submit each user's model and wait for it, so models_post hits the cache."""
+    job_urls = []
+    for user in users:
+        client = logged_in_client(flask_app, user)
+        location = client.post('/models', data=user['model_form']).headers['Location']
+        job_urls.append((client, location))
+    deadline = time.monotonic() + timeout
+    for client, location in job_urls:
+        if '/models/jobs/' not in location:
+            raise RuntimeError(f'Training was not queued (redirected to {location})')
+        while client.get(f'{location}/status').get_json()['status'] in ('queued', 'running'):
+            if time.monotonic() > deadline:
+                raise RuntimeError('Timed out waiting for training jobs')
+            time.sleep(0.2)
+
+
+def run_scenario(flask_app, users, name, threads, requests_per_thread, days, seed_value=0):
+    request_fn, expected = SCENARIOS[name]
+    latencies = [[] for _ in range(threads)]
+    queries = [[] for _ in range(threads)]
+    errors = [0] * threads
+    spans = [None] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(i):
+        user = users[i % len(users)]
+        client = logged_in_client(flask_app, user)
+        rng = random.Random(seed_value + i)
+        request_fn(client, user, rng, days)  # Warm up this thread's connection and caches
+        barrier.wait()
+        started = time.perf_counter()
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            response = request_fn(client, user, rng, days)
+            latencies[i].append(time.perf_counter() - start)
+            if response.status_code != expected:
+                errors[i] += 1
+            match = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+            if match:
+                queries[i].append(int(match.group(1)))
+        spans[i] = (started, time.perf_counter())
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    # Timed from inside the threads: they can run several requests between
+    # leaving the barrier and the main thread getting the GIL back
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+
+    all_latencies = sorted(value for values in latencies for value in values)
+    all_queries = [value for values in queries for value in values]
+    return {
+        'requests': len(all_latencies),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'req_per_sec': round(len(all_latencies) / elapsed, 1),
+        'p50_ms': round(results.percentile(all_latencies, 0.5) * 1000, 2),
+        'p95_ms': round(results.percentile(all_latencies, 0.95) * 1000, 2),
+        'p99_ms': round(results.percentile(all_latencies, 0.99) * 1000, 2),
+        'max_ms': round(all_latencies[-1] * 1000, 2),
+        'queries_per_request': round(sum(all_queries) / len(all_queries), 1) if all_queries else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the main pages with concurrent test clients.')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--boards', type=int, default=2, help='boards per user')
+    parser.add_argument('--habits', type=int, default=8, help='habits per board')
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50, help='requests per thread per scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--no-page-cache', action='store_true', help='render every page (PAGE_CACHE_ENTRIES=0)')
+    parser.add_argument('--json', default='bench_web.json', help='where to write the results')
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json)
+    workdir = tempfile.mkdtemp()
+    try:
+        database = os.path.join(workdir, 'habits.db')
+        summary = seed.seed_database(database, args.users, args.boards, args.habits, args.years)
+        print(f"seeded {summary['users']} users, {summary['habits']} habits, "
+              f"{summary['entries']} entries in {summary['seconds']}s")
+        from app import create_app
+        import db
+
+        flask_app = create_app({'DATABASE': database, 'SECRET_KEY': 'benchmark',
+                                'MODEL_CACHE_DIR': os.path.join(workdir, 'model_cache'),
+                                'PAGE_CACHE_ENTRIES': 0 if args.no_page_cache else 1024})
+
+        with flask_app.app_context():
+            users = load_users(db.get_db(), args.users)
+        last_day = date.today()
+        days = [(last_day - timedelta(days=i)).isoformat() for i in range(args.years * 365)]
+        if 'models_post' in args.scenarios:
+            started = time.perf_counter()
+            train_models(flask_app, users)
+            print(f'trained {len(users)} models in {time.perf_counter() - started:.1f}s')
+
+        print(f'{"scenario":<14} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"errors":>7}')
+        scenarios = {}
+        for name in args.scenarios:
+            result = run_scenario(flask_app, users, name, args.threads, args.requests, days)
+            scenarios[name] = result
+            queries = '-' if result['queries_per_request'] is None else result['queries_per_request']
+            print(f"{name:<14} {result['req_per_sec']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                  f"{result['p99_ms']:>8} {queries:>8} {result['errors']:>7}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    metrics = {}
+    for name, result in scenarios.items():
+        for key in ('req_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            if result[key] is not None:
+                metrics[f'web.{name}.{key}'] = result[key]
+    params = dict(vars(args), json=None)
+    results.write_results(json_path, 'web', params, metrics, {'seed': summary, 'scenarios': scenarios})
+    print(f'results written to {json_path}')
+
+    over_budget = [name for name, result in scenarios.items()
+                   if name in QUERY_BUDGETS and (result['queries_per_request'] or 0) > QUERY_BUDGETS[name]]
+    for name in over_budget:
+        print(f"{name} ran {scenarios[name]['queries_per_request']} queries per request, "
+              f'budget is {QUERY_BUDGETS[name]}')
+    raise SystemExit(1 if over_budget else 0)
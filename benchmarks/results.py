@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# JSON results shared by bench_web.py and bench_ml.py, and a comparison of
+# two result files. Every result file has a flat 'metrics' dictionary;
+# names ending in _per_sec are better when higher, everything else (times
+# in _ms or _s) when lower.
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_results(path, benchmark, params, metrics, details=None):
+    results = {'benchmark': benchmark, 'meta': metadata(), 'params': params,
+               'metrics': metrics, 'details': details or {}}
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare the metrics of two result files.
+
+    Returns:
+        rows: (name, baseline, current, change) for every metric in both,
+            where change is the fractional slowdown (positive is worse)
+        regressions: The rows whose change exceeds threshold
+    """
+    rows = []
+    for name in sorted(set(baseline['metrics']) & set(current['metrics'])):
+        old, new = baseline['metrics'][name], current['metrics'][name]
+        if not old or not new:
+            continue
+        change = (old / new - 1) if name.endswith('_per_sec') else (new / old - 1)
+        rows.append((name, old, new, change))
+    return rows, [row for row in rows if row[3] > threshold]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fractional slowdown reported as a regression (default 0.1)')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.threshold)
+
+    print(f"baseline {baseline['meta']['commit']} ({baseline['meta']['time']}), "
+          f"current {current['meta']['commit']} ({current['meta']['time']})")
+    width = max((len(row[0]) for row in rows), default=6)
+    print(f'{"metric":<{width}} {"baseline":>10} {"current":>10} {"change":>8}')
+    for name, old, new, change in rows:
+        flag = '  <-- regression' if change > args.threshold else ''
+        print(f'{name:<{width}} {old:>10.4g} {new:>10.4g} {change:>+7.1%}{flag}')
+    sys.exit(1 if regressions else 0)
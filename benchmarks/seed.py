@@ -0,0 +1,103 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import entries
+import migrations
+import rollups
+
+# Builds a synthetic habits.db for the benchmarks: every user gets the same
+# number of time-series boards and habits, each habit logged on ~85% of the
+# days over the given number of years. Every fourth habit is categorical,
+# every fourth boolean and the rest numeric. Users are named user<N> and
+# all share PASSWORD.
+
+PASSWORD = 'benchmark'
+CATEGORIES = ['Low', 'Medium', 'High']
+
+
+def seed_database(path, users=10, boards=2, habits=8, years=2, coverage=0.85, seed=0, end=None):
+    """
+    Create and fill a new database at path.
+
+    Args:
+        path: Database file to create; must not exist yet
+        users, boards, habits: Users, boards per user and habits per board
+        years: Years of daily entries ending on end (default today)
+        coverage: Fraction of days each habit is logged on
+
+    Returns:
+        summary: Dictionary with the counts written and the seconds taken
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f'{path} already exists')
+    started = time.perf_counter()
+    migrations.migrate(path)
+
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    n_days = years * 365
+    days = [(end - timedelta(days=n_days - 1 - i)).isoformat() for i in range(n_days)]
+    password_hash = generate_password_hash(PASSWORD)
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    n_entries = 0
+    with conn:
+        for u in range(users):
+            user_id = conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)',
+                                   (f'user{u + 1}', password_hash)).lastrowid
+            for b in range(boards):
+                board_id = conn.execute(
+                    "INSERT INTO habit_boards (user_id, name, description, board_type) VALUES (?, ?, ?, 'time-series')",
+                    (user_id, f'Board {b + 1}', 'Synthetic benchmark board')).lastrowid
+                for h in range(habits):
+                    variable_type = ('categorical', 'numeric', 'boolean', 'numeric')[h % 4]
+                    habit_id = conn.execute(
+                        "INSERT INTO habits (user_id, board_id, name, frequency, variable_type) "
+                        "VALUES (?, ?, ?, 'daily', ?)",
+                        (user_id, board_id, f'Habit {b + 1}.{h + 1}', variable_type)).lastrowid
+                    if variable_type == 'categorical':
+                        conn.executemany('INSERT INTO habit_options (habit_id, option_value) VALUES (?, ?)',
+                                         [(habit_id, option) for option in CATEGORIES])
+
+                    logged = np.flatnonzero(rng.random(n_days) < coverage)
+                    if variable_type == 'categorical':
+                        values = [CATEGORIES[i] for i in rng.integers(0, len(CATEGORIES), len(logged))]
+                    elif variable_type == 'boolean':
+                        values = [str(v) for v in rng.integers(0, 2, len(logged))]
+                    else:
+                        values = [str(v) for v in np.round(rng.gamma(2.0, 30.0, len(logged)))]
+                    rows = entries.typed_rows(conn, [(habit_id, days[i], value) for i, value in zip(logged, values)])
+                    conn.executemany(entries.UPSERT_SQL, rows)
+                    n_entries += len(rows)
+        rollups.rebuild(conn)
+    conn.execute('ANALYZE')
+    conn.close()
+
+    return {'users': users, 'boards': users * boards, 'habits': users * boards * habits,
+            'entries': n_entries, 'days': n_days, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create a synthetic habits database for benchmarking.')
+    parser.add_argument('path')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--boards', type=int, default=2, help='boards per user')
+    parser.add_argument('--habits', type=int, default=8, help='habits per board')
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    summary = seed_database(args.path, args.users, args.boards, args.habits, args.years, seed=args.seed)
+    print(f"{summary['users']} users, {summary['habits']} habits, {summary['entries']} entries "
+          f"in {summary['seconds']}s")
@@ -0,0 +1,39 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Settings for create_app, read from HABITS_* environment variables so the
+# same code runs under the dev server and a multi-process WSGI server:
+#
+#   HABITS_DATABASE                 SQLite file (default habits.db next to app.py)
+#   HABITS_SECRET_KEY               Session signing key; set this in production
+#   HABITS_DB_POOL_SIZE             Idle connections kept per worker process
+#   HABITS_MODEL_CACHE_DIR          Where trained models are cached
+#   HABITS_TRAINING_WORKERS         Model training processes per worker process
+#   HABITS_PAGE_CACHE_DIR           Page cache shared by worker processes (in-process if unset,
+#                                   next to the database under wsgi.py)
+#   HABITS_PAGE_CACHE_TTL           Seconds a cached page is served for
+#   HABITS_METRICS_TOKEN            Bearer token for /metrics (localhost only if unset)
+#   HABITS_PRELOAD_ML               1 to import numpy/pandas/scikit-learn at startup
+#   HABITS_PROFILE_SLOW_REQUESTS_MS Profile requests slower than this (off if unset)
+#   HABITS_PROFILE_DIR              Where those profiles are written
+
+
+def _int(value):
+    return int(value) if value not in (None, '') else None
+
+
+class Config:
+    def __init__(self, environ=None):
+        env = os.environ if environ is None else environ
+        self.DATABASE = env.get('HABITS_DATABASE', os.path.join(BASE_DIR, 'habits.db'))
+        self.SECRET_KEY = env.get('HABITS_SECRET_KEY')
+        self.DB_POOL_SIZE = _int(env.get('HABITS_DB_POOL_SIZE', 8))
+        self.MODEL_CACHE_DIR = env.get('HABITS_MODEL_CACHE_DIR', os.path.join(BASE_DIR, 'model_cache'))
+        self.TRAINING_WORKERS = _int(env.get('HABITS_TRAINING_WORKERS', 2))
+        self.PAGE_CACHE_DIR = env.get('HABITS_PAGE_CACHE_DIR') or None
+        self.PAGE_CACHE_TTL = _int(env.get('HABITS_PAGE_CACHE_TTL', 300))
+        self.METRICS_TOKEN = env.get('HABITS_METRICS_TOKEN') or None
+        self.PRELOAD_ML = env.get('HABITS_PRELOAD_ML', '0') == '1'
+        self.PROFILE_SLOW_REQUESTS_MS = _int(env.get('HABITS_PROFILE_SLOW_REQUESTS_MS'))
+        self.PROFILE_DIR = env.get('HABITS_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
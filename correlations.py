@@ -0,0 +1,182 @@
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+# numpy and pandas are imported inside the functions that use them, so
+# registering the cache at startup doesn't pull them into every web worker.
+
+
+def load_daily_matrix(conn, user_id):
+    """
+    Load all of a user's numeric and boolean habits onto one daily calendar.
+
+    Returns:
+        habits: List of dictionaries with each column's 'id', 'name' and 'type'
+        dates: DatetimeIndex with one entry per calendar day from the first
+            to the last logged day, so shifting by n rows is a lag of n days
+        values: 2-D array (days x habits) with NaN on days without an entry
+    """
+    import numpy as np
+    import pandas as pd
+
+    rows = conn.execute('''
+        SELECT h.id, h.name, h.variable_type, e.date, e.num_value
+        FROM habits h
+        JOIN entries e ON e.habit_id = h.id
+        WHERE h.user_id = ? AND h.variable_type IN ('numeric', 'boolean') AND e.num_value IS NOT NULL
+        ORDER BY h.id
+    ''', (user_id,)).fetchall()
+    if not rows:
+        return [], pd.DatetimeIndex([]), np.empty((0, 0))
+
+    frame = pd.DataFrame.from_records(rows, columns=['id', 'name', 'type', 'date', 'num_value'])
+    habit_codes, habit_ids = pd.factorize(frame['id'], sort=True)
+    days = pd.to_datetime(frame['date']).to_numpy(dtype='datetime64[D]')
+    start = days.min()
+    dates = pd.date_range(start, days.max(), freq='D')
+
+    values = np.full((len(dates), len(habit_ids)), np.nan)
+    values[(days - start).astype(int), habit_codes] = frame['num_value'].to_numpy(dtype=float)
+
+    names = frame.drop_duplicates('id').set_index('id')
+    habits = [{'id': int(habit_id), 'name': names.at[habit_id, 'name'], 'type': names.at[habit_id, 'type']}
+              for habit_id in habit_ids]
+    return habits, dates, values
+
+
+def pairwise_pearson(a, b, min_periods=10):
+    """
+    Pearson correlation of every column of a with every column of b, using
+    only the rows where both values are present.
+
+    All pairwise sums come from a handful of matrix products over the
+    zero-filled data and its presence mask, so the cost is a few BLAS calls
+    rather than a Python loop over habit pairs.
+
+    Args:
+        a, b: 2-D arrays with the same number of rows, NaN marking gaps
+        min_periods: Pairs with fewer overlapping rows get NaN
+
+    Returns:
+        corr: Array of shape (a columns, b columns)
+        counts: Number of overlapping rows behind each coefficient
+    """
+    import numpy as np
+
+    mask_a, mask_b = ~np.isnan(a), ~np.isnan(b)
+    a0, b0 = np.where(mask_a, a, 0.0), np.where(mask_b, b, 0.0)
+    ma, mb = mask_a.astype(float), mask_b.astype(float)
+
+    n = ma.T @ mb
+    sum_a = a0.T @ mb
+    sum_b = ma.T @ b0
+    sum_aa = (a0 * a0).T @ mb
+    sum_bb = ma.T @ (b0 * b0)
+    sum_ab = a0.T @ b0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sum_ab - sum_a * sum_b
+        var_a = n * sum_aa - sum_a ** 2
+        var_b = n * sum_bb - sum_b ** 2
+        corr = cov / np.sqrt(var_a * var_b)
+    corr[(n < min_periods) | (var_a <= 0) | (var_b <= 0)] = np.nan
+    return np.clip(corr, -1, 1), n.astype(int)
+
+
+def correlation_report(habits, values, max_lag=1, min_periods=10):
+    """
+    Pearson, Spearman and lagged Pearson correlations between all habits.
+
+    Spearman ranks each habit over its own logged days and then correlates
+    the ranks pairwise; this matches the textbook definition whenever two
+    habits were logged on the same days.
+
+    Lagged matrices are keyed by lag in days: lagged[lag][i][j] correlates
+    habit i on a day with habit j lag days later, e.g. tonight's sleep with
+    tomorrow's productivity.
+
+    Returns:
+        report: JSON-ready dictionary; missing coefficients are None
+    """
+    import numpy as np
+    import pandas as pd
+
+    def to_json(matrix):
+        return [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in matrix]
+
+    pearson, counts = pairwise_pearson(values, values, min_periods)
+    ranks = pd.DataFrame(values).rank(axis=0).to_numpy()
+    spearman, _ = pairwise_pearson(ranks, ranks, min_periods)
+
+    lagged = {}
+    for lag in range(1, max_lag + 1):
+        if lag >= len(values):
+            break
+        corr, _ = pairwise_pearson(values[:-lag], values[lag:], min_periods)
+        lagged[str(lag)] = to_json(corr)
+
+    return {
+        'habits': habits,
+        'days': len(values),
+        'min_periods': min_periods,
+        'counts': counts.tolist(),
+        'pearson': to_json(pearson),
+        'spearman': to_json(spearman),
+        'lagged': lagged,
+    }
+
+
+class CorrelationCache:
+    """
+    In-process LRU cache of correlation reports, one slot per user.
+
+    Each slot remembers the name and data_version of every habit the report
+    was built from; logging, editing or deleting an entry bumps that
+    version, so the next lookup after a write or a rename misses and the
+    report is rebuilt.
+    """
+
+    def __init__(self, max_users=256):
+        self.max_users = max_users
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get_report(self, conn, user_id, max_lag=1, min_periods=10):
+        versions = tuple(conn.execute(
+            'SELECT id, name, data_version FROM habits WHERE user_id = ? ORDER BY id', (user_id,)).fetchall())
+        key = (tuple(tuple(row) for row in versions), max_lag, min_periods)
+        with self._lock:
+            cached = self._reports.get(user_id)
+            if cached is not None and cached[0] == key:
+                self._reports.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return cached[1]
+            self._stats['misses'] += 1
+
+        habits, dates, values = load_daily_matrix(conn, user_id)
+        report = correlation_report(habits, values, max_lag, min_periods)
+        report['start'] = dates[0].date().isoformat() if len(dates) else None
+        report['end'] = dates[-1].date().isoformat() if len(dates) else None
+
+        with self._lock:
+            self._reports[user_id] = (key, report)
+            self._reports.move_to_end(user_id)
+            while len(self._reports) > self.max_users:
+                self._reports.popitem(last=False)
+        return report
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, users=len(self._reports))
+
+
+def get_cache(app=None):
+    app = app or current_app
+    return app.extensions['correlation_cache']
+
+
+def init_app(app):
+    app.config.setdefault('CORRELATION_CACHE_USERS', 256)
+    app.extensions['correlation_cache'] = CorrelationCache(app.config['CORRELATION_CACHE_USERS'])
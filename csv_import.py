@@ -0,0 +1,158 @@
+import csv
+import io
+import time
+from datetime import datetime
+
+import entries
+
+# Bulk import of historical entries from a CSV file into one board.
+#
+# Two layouts are accepted, told apart by the header row:
+#   long:  date,habit,value[,...]  one row per entry; extra columns, like
+#                                  those in export.py's CSV, are ignored
+#   wide:  date,<habit>,<habit>... one row per day, one column per habit
+# Habits are matched by name (case-insensitive) or, in the long layout, by
+# id. Empty cells are skipped. The file is read row by row from the upload
+# stream and written in chunks, one transaction per chunk, so memory use
+# doesn't grow with the size of the file.
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%d.%m.%Y')
+LONG_HEADER = ['date', 'habit', 'value']
+
+
+class ImportReport:
+    def __init__(self, max_errors=100):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.layout = None
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'message': message})
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def to_dict(self):
+        return {
+            'layout': self.layout,
+            'rows': self.rows,
+            'imported': self.imported,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows / self.seconds) if self.seconds else None,
+        }
+
+
+def parse_date(raw):
+    raw = raw.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{raw}'")
+
+
+def _load_board_habits(conn, board_id):
+    habits = conn.execute('SELECT id, name, variable_type FROM habits WHERE board_id = ?', (board_id,)).fetchall()
+    return habits, entries.load_option_spellings(conn, [habit['id'] for habit in habits])
+
+
+def _parse_rows(reader, header, habits, options, report):
+    """Yield validated (habit_id, date, value) tuples from the CSV rows."""
+    by_name = {habit['name'].strip().lower(): habit for habit in habits}
+    by_id = {str(habit['id']): habit for habit in habits}
+
+    if [column.strip().lower() for column in header[:3]] == LONG_HEADER:
+        report.layout = 'long'
+        columns = None
+    else:
+        report.layout = 'wide'
+        columns = []
+        for position, name in enumerate(header[1:], start=1):
+            habit = by_name.get(name.strip().lower())
+            if habit is None:
+                report.error(1, f"Column '{name}' doesn't match a habit on this board and was ignored")
+            else:
+                columns.append((position, habit))
+
+    for line, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        report.rows += 1
+        try:
+            day = parse_date(row[0])
+        except ValueError as e:
+            report.error(line, str(e))
+            continue
+
+        if columns is None:
+            if len(row) < 3:
+                report.error(line, 'Expected date,habit,value')
+                continue
+            key = row[1].strip()
+            habit = by_name.get(key.lower()) or by_id.get(key)
+            if habit is None:
+                report.error(line, f"Unknown habit '{key}'")
+                continue
+            cells = [(habit, row[2])]
+        else:
+            cells = [(habit, row[position]) for position, habit in columns if position < len(row)]
+
+        for habit, raw in cells:
+            if not raw.strip():
+                continue
+            try:
+                yield habit['id'], day, entries.clean_value(habit, options[habit['id']], raw)
+            except ValueError as e:
+                report.error(line, str(e))
+
+
+def import_csv(conn, board_id, stream, chunk_size=1000, encoding='utf-8-sig'):
+    """
+    Import entries for a board's habits from a CSV upload.
+
+    Existing entries for the same habit and day are overwritten, so an
+    import can be re-run after fixing errors in the file.
+
+    Args:
+        conn: Database connection
+        board_id: Board whose habits the file refers to
+        stream: Binary file-like object, e.g. the upload's stream
+        chunk_size: Entries written per transaction
+
+    Returns:
+        report: ImportReport with row counts, timing and per-row errors
+    """
+    report = ImportReport()
+    habits, options = _load_board_habits(conn, board_id)
+    reader = csv.reader(io.TextIOWrapper(stream, encoding=encoding, newline=''))
+    header = next(reader, None)
+    if header is None:
+        report.error(1, 'The file is empty')
+        report.finish()
+        return report
+
+    chunk = []
+    try:
+        for entry in _parse_rows(reader, header, habits, options, report):
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                with conn:
+                    report.imported += entries.upsert_entries(conn, chunk)
+                chunk = []
+        if chunk:
+            with conn:
+                report.imported += entries.upsert_entries(conn, chunk)
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.error(report.rows + 1, f'Could not read the file: {e}')
+    report.finish()
+    return report
@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import threading
+
+from flask import current_app, g, jsonify, request
+
+# Pragmas applied to every new connection. WAL lets readers proceed while a
+# writer holds the lock, and busy_timeout makes writers wait for each other
+# instead of failing straight away with "database is locked".
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',     # safe with WAL, avoids an fsync per commit
+    'cache_size': -16000,        # negative means KiB, so ~16MB page cache
+    'mmap_size': 268435456,      # 256MB memory-mapped I/O
+    'busy_timeout': 5000,        # milliseconds
+    'temp_store': 'MEMORY',
+}
+
+
+def connect(database, pragmas=None, cached_statements=256, factory=sqlite3.Connection):
+    """
+    Open a tuned SQLite connection.
+
+    Args:
+        database: Path to the SQLite database file
+        pragmas: Optional dictionary overriding DEFAULT_PRAGMAS
+        cached_statements: Size of the per-connection prepared statement cache
+        factory: sqlite3.Connection subclass to create, e.g.
+            metrics.TimedConnection
+
+    Returns:
+        conn: sqlite3.Connection with row_factory set to sqlite3.Row
+    """
+    # Implicit transactions start with BEGIN IMMEDIATE, taking the write
+    # lock before the first write rather than upgrading a read lock halfway
+    # through. An upgrade that loses a race with another process fails at
+    # once with "database is locked"; waiting for the lock up front lets
+    # busy_timeout queue writers from every worker process instead.
+    conn = sqlite3.connect(database,
+                           timeout=DEFAULT_PRAGMAS['busy_timeout'] / 1000,
+                           isolation_level='IMMEDIATE',
+                           check_same_thread=False,
+                           cached_statements=cached_statements,
+                           factory=factory)
+    conn.row_factory = sqlite3.Row
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+    for name, value in settings.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of SQLite connections.
+
+    Connections are handed out one per request and returned on app context
+    teardown, so the prepared statement cache of each connection survives
+    between requests. At most max_size idle connections are kept around;
+    any extra connections opened under a burst are closed when released.
+    """
+
+    def __init__(self, database, max_size=8, pragmas=None, cached_statements=256, factory=sqlite3.Connection):
+        self.database = database
+        self.max_size = max_size
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self.factory = factory
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'acquired': 0,
+            'reused': 0,
+            'released': 0,
+            'rolled_back': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+
+    def _check_pid(self):
+        # Connections must never be shared across a fork; a child process
+        # starts with an empty pool and leaves the parent's handles alone.
+        if os.getpid() != self._pid:
+            self._idle = []
+            self._pid = os.getpid()
+            self._stats['in_use'] = 0
+
+    def acquire(self):
+        with self._lock:
+            self._check_pid()
+            conn = self._idle.pop() if self._idle else None
+            self._stats['acquired'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+            if conn is not None:
+                self._stats['reused'] += 1
+                return conn
+            self._stats['created'] += 1
+        return connect(self.database, self.pragmas, self.cached_statements, self.factory)
+
+    def release(self, conn):
+        try:
+            # Never hand out a connection with someone else's half-finished
+            # transaction, e.g. a route that raised before commit().
+            if conn.in_transaction:
+                conn.rollback()
+                with self._lock:
+                    self._stats['rolled_back'] += 1
+        except sqlite3.ProgrammingError:
+            # Already closed by the caller; just drop it
+            with self._lock:
+                self._stats['in_use'] -= 1
+                self._stats['closed'] += 1
+            return
+
+        with self._lock:
+            self._stats['released'] += 1
+            self._stats['in_use'] -= 1
+            if len(self._idle) < self.max_size and os.getpid() == self._pid:
+                self._idle.append(conn)
+                return
+            self._stats['closed'] += 1
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats['closed'] += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['max_size'] = self.max_size
+        return stats
+
+
+def get_pool(app=None):
+    app = app or current_app
+    return app.extensions['db_pool']
+
+
+def get_db():
+    """Return the connection bound to the current app context, acquiring one on first use."""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+def database_busy(error):
+    # Still locked after busy_timeout: ask the client to retry rather than
+    # failing with a 500
+    if 'locked' not in str(error) and 'busy' not in str(error):
+        raise error
+    headers = {'Retry-After': '1'}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'The database is busy, try again'}), 503, headers
+    return 'The database is busy, please try again in a moment.', 503, headers
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', 'habits.db')
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_CACHED_STATEMENTS', 256)
+    app.config.setdefault('DB_PRAGMAS', {})
+
+    app.extensions['db_pool'] = ConnectionPool(app.config['DATABASE'],
+                                               max_size=app.config['DB_POOL_SIZE'],
+                                               pragmas=app.config['DB_PRAGMAS'],
+                                               cached_statements=app.config['DB_CACHED_STATEMENTS'])
+    app.teardown_appcontext(close_db)
+    app.register_error_handler(sqlite3.OperationalError, database_busy)
@@ -0,0 +1,217 @@
+# Write path for habit entries.
+#
+# Every entry keeps the raw form value in entries.value and a typed copy
+# for reads: num_value (REAL) for numeric and boolean habits, and option_id
+# (the habit_options row) for categorical habits. The typed copy is worked
+# out once here at write time, so plots and model training can read native
+# numbers from SQLite without parsing anything.
+#
+# Each write also bumps habits.data_version for the habits it touched, so
+# anything derived from a habit's entries can tell when it is stale, and
+# refreshes the weekly/monthly rollups covering the days it touched.
+
+import rollups
+
+TRUE_VALUES = ('true', '1', 'yes')
+BOOLEAN_VALUES = {'1': '1', 'true': '1', 'yes': '1', 'y': '1',
+                  '0': '0', 'false': '0', 'no': '0', 'n': '0'}
+
+ENTRY_PAGE_SIZE = 50
+
+UPSERT_SQL = '''
+    INSERT INTO entries (habit_id, date, value, num_value, option_id) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (habit_id, date) DO UPDATE
+    SET value = excluded.value, num_value = excluded.num_value, option_id = excluded.option_id
+'''
+
+
+def to_number(variable_type, value):
+    """
+    Convert a raw entry value to its numeric form.
+
+    Args:
+        variable_type: 'numeric', 'boolean' or 'categorical'
+        value: Raw value as submitted by the user
+
+    Returns:
+        number: Float for numeric/boolean habits, None for categorical habits
+            or numeric values that can't be parsed
+    """
+    if value is None:
+        return None
+    if variable_type == 'boolean':
+        return 1.0 if str(value).strip().lower() in TRUE_VALUES else 0.0
+    if variable_type == 'numeric':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def clean_value(habit, options, raw):
+    """
+    Validate a raw value from an import or API client against a habit and
+    convert it to the form the log forms submit: the number as written for
+    numeric habits, '1'/'0' for boolean habits and the option's own
+    spelling for categorical habits.
+
+    Args:
+        habit: Habit row with 'name' and 'variable_type'
+        options: Dictionary mapping lowercased option to its spelling, as
+            returned by load_option_spellings
+        raw: Value to validate
+
+    Raises:
+        ValueError: If the value isn't valid for the habit
+    """
+    raw = str(raw).strip()
+    if habit['variable_type'] == 'numeric':
+        try:
+            float(raw)
+        except ValueError:
+            raise ValueError(f"{habit['name']}: '{raw}' is not a number")
+        return raw
+    if habit['variable_type'] == 'boolean':
+        try:
+            return BOOLEAN_VALUES[raw.lower()]
+        except KeyError:
+            raise ValueError(f"{habit['name']}: '{raw}' is not yes/no")
+    try:
+        return options[raw.lower()]
+    except KeyError:
+        raise ValueError(f"{habit['name']}: '{raw}' is not one of its options")
+
+
+def load_option_spellings(conn, habit_ids):
+    """Map each habit id to a dictionary of lowercased option -> option, for clean_value."""
+    options = {habit_id: {} for habit_id in habit_ids}
+    if habit_ids:
+        placeholders = ','.join('?' * len(habit_ids))
+        for row in conn.execute(f'SELECT habit_id, option_value FROM habit_options WHERE habit_id IN ({placeholders})',
+                                list(habit_ids)):
+            options[row['habit_id']][row['option_value'].lower()] = row['option_value']
+    return options
+
+
+def load_habit_types(conn, habit_ids):
+    """
+    Fetch variable types and categorical option ids for a set of habits.
+
+    Returns:
+        types: Dictionary mapping habit id to variable_type
+        options: Dictionary mapping (habit id, option value) to option id
+    """
+    habit_ids = list(set(habit_ids))
+    if not habit_ids:
+        return {}, {}
+    placeholders = ','.join('?' * len(habit_ids))
+    types = {row['id']: row['variable_type'] for row in conn.execute(
+        f'SELECT id, variable_type FROM habits WHERE id IN ({placeholders})', habit_ids)}
+    options = {(row['habit_id'], row['option_value']): row['id'] for row in conn.execute(
+        f'SELECT id, habit_id, option_value FROM habit_options WHERE habit_id IN ({placeholders})', habit_ids)}
+    return types, options
+
+
+def typed_rows(conn, rows):
+    """Expand (habit_id, date, value) rows with their num_value and option_id."""
+    rows = list(rows)
+    types, options = load_habit_types(conn, [row[0] for row in rows])
+    typed = []
+    for habit_id, date, value in rows:
+        variable_type = types.get(habit_id)
+        typed.append((habit_id, date, value,
+                      to_number(variable_type, value),
+                      options.get((habit_id, value)) if variable_type == 'categorical' else None))
+    return typed
+
+
+def upsert_entries(conn, rows):
+    """
+    Insert or replace entries, one per habit per day.
+
+    Args:
+        conn: Database connection; the caller owns the transaction
+        rows: Iterable of (habit_id, date, value) tuples
+
+    Returns:
+        count: Number of rows written
+    """
+    typed = typed_rows(conn, rows)
+    conn.executemany(UPSERT_SQL, typed)
+    bump_data_version(conn, {row[0] for row in typed})
+    rollups.refresh(conn, [(row[0], row[1]) for row in typed])
+    return len(typed)
+
+
+def update_entry_value(conn, entry_id, habit_id, value):
+    """Change the value of an existing entry, keeping its typed columns in sync."""
+    _, _, _, num_value, option_id = typed_rows(conn, [(habit_id, None, value)])[0]
+    conn.execute('UPDATE entries SET value = ?, num_value = ?, option_id = ? WHERE id = ?',
+                 (value, num_value, option_id, entry_id))
+    bump_data_version(conn, [habit_id])
+    rollups.refresh(conn, [(habit_id, _entry_date(conn, entry_id))])
+
+
+def delete_entry(conn, entry_id, habit_id):
+    day = _entry_date(conn, entry_id)
+    conn.execute('DELETE FROM entries WHERE id = ?', (entry_id,))
+    bump_data_version(conn, [habit_id])
+    rollups.refresh(conn, [(habit_id, day)])
+
+
+def _entry_date(conn, entry_id):
+    row = conn.execute('SELECT date FROM entries WHERE id = ?', (entry_id,)).fetchone()
+    return row[0] if row else None
+
+
+def entry_page(conn, habit_id, cursor=None, limit=ENTRY_PAGE_SIZE):
+    """
+    Fetch one page of a habit's entries, newest first.
+
+    Pages are keyed on (date, id) rather than an offset, so each page is a
+    single index range read however far back it is.
+
+    Args:
+        conn: Database connection
+        habit_id: Habit whose entries to list
+        cursor: The next_cursor of the previous page, or None for the newest
+        limit: Maximum number of entries on the page
+
+    Returns:
+        entries: List of entry rows
+        next_cursor: Cursor for the following page, or None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor:
+        date, _, entry_id = cursor.rpartition(':')
+        rows = conn.execute('''
+            SELECT * FROM entries
+            WHERE habit_id = ? AND (date, id) < (?, ?)
+            ORDER BY date DESC, id DESC LIMIT ?
+        ''', (habit_id, date, int(entry_id), limit + 1)).fetchall()
+    else:
+        rows = conn.execute('SELECT * FROM entries WHERE habit_id = ? ORDER BY date DESC, id DESC LIMIT ?',
+                            (habit_id, limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], f"{last['date']}:{last['id']}"
+
+
+def bump_data_version(conn, habit_ids):
+    conn.executemany('UPDATE habits SET data_version = data_version + 1 WHERE id = ?',
+                     [(habit_id,) for habit_id in habit_ids])
+
+
+def relink_options(conn, habit_id):
+    """Point categorical entries at the current habit_options rows after the options were rewritten."""
+    conn.execute('''
+        UPDATE entries SET option_id = (
+            SELECT o.id FROM habit_options o
+            WHERE o.habit_id = entries.habit_id AND o.option_value = entries.value
+        )
+        WHERE habit_id = ?
+    ''', (habit_id,))
@@ -0,0 +1,171 @@
+import csv
+import importlib.util
+import io
+import tempfile
+from datetime import date
+
+# Export of a user's entries, for one board or all of them.
+#
+# CSV is streamed straight from a cursor with fetchmany, so memory use is
+# bounded by the batch size whatever the history length. Its first three
+# columns match the long layout csv_import accepts, so an exported board can
+# be imported again.
+#
+# Parquet (when pyarrow is installed) is pivoted wide: one row per date and
+# one column per habit. Parquet files end with a footer describing the row
+# groups, so the file is written to a spooled temporary file one row group
+# at a time and then streamed out. pyarrow is optional and only imported
+# when a Parquet export is requested.
+
+CSV_HEADER = ['date', 'habit', 'value', 'habit_id', 'board']
+
+ENTRIES_SQL = '''
+    SELECT e.date, h.name, e.value, h.id, b.name
+    FROM habits h
+    JOIN habit_boards b ON b.id = h.board_id
+    JOIN entries e ON e.habit_id = h.id
+    WHERE h.user_id = ? {board_filter}
+    ORDER BY b.id, h.id, e.date
+'''
+
+
+def parquet_available():
+    # Cheap check for showing the export links; doesn't import pyarrow
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _import_pyarrow():
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def _query(board_id):
+    board_filter = 'AND h.board_id = ?' if board_id is not None else ''
+    return ENTRIES_SQL.format(board_filter=board_filter)
+
+
+def _params(user_id, board_id):
+    return (user_id,) if board_id is None else (user_id, board_id)
+
+
+def iter_csv(conn, user_id, board_id=None, batch_size=1000):
+    """
+    Yield a CSV export of a user's entries in chunks of batch_size rows.
+
+    Args:
+        conn: Database connection
+        user_id: Owner of the entries
+        board_id: Optional board to restrict the export to
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+
+    cursor = conn.execute(_query(board_id), _params(user_id, board_id))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def _wide_columns(habits):
+    # Habit names are only unique within a board, so fall back to adding the
+    # board name (and then the id) when two habits share a name
+    seen = {}
+    for habit in habits:
+        seen[habit['name']] = seen.get(habit['name'], 0) + 1
+    columns = []
+    for habit in habits:
+        name = habit['name']
+        if seen[name] > 1:
+            name = f"{habit['board']} / {habit['name']}"
+        if name in columns or name == 'date':
+            name = f"{name} ({habit['id']})"
+        columns.append(name)
+    return columns
+
+
+def write_parquet(conn, sink, user_id, board_id=None, batch_days=1000):
+    """
+    Write a wide Parquet export (one row per date, one column per habit).
+
+    Numeric and boolean habits are float columns holding num_value;
+    categorical habits are string columns. Days without an entry are null.
+    One row group is written per batch_days dates.
+
+    Raises:
+        ImportError: If pyarrow isn't installed
+    """
+    pa, pq = _import_pyarrow()
+
+    board_filter = 'AND h.board_id = ?' if board_id is not None else ''
+    habits = conn.execute(f'''
+        SELECT h.id, h.name, h.variable_type, b.name AS board
+        FROM habits h JOIN habit_boards b ON b.id = h.board_id
+        WHERE h.user_id = ? {board_filter}
+        ORDER BY b.id, h.id
+    ''', _params(user_id, board_id)).fetchall()
+    names = _wide_columns(habits)
+    position = {habit['id']: i for i, habit in enumerate(habits)}
+    categorical = [habit['variable_type'] == 'categorical' for habit in habits]
+    schema = pa.schema([('date', pa.date32())] +
+                       [(name, pa.string() if is_cat else pa.float64()) for name, is_cat in zip(names, categorical)])
+
+    def flush(writer, dates, cells):
+        arrays = [pa.array(dates, type=pa.date32())] + [
+            pa.array(column, type=field.type) for column, field in zip(cells, list(schema)[1:])]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    cursor = conn.execute(f'''
+        SELECT e.date, e.habit_id, e.value, e.num_value
+        FROM habits h JOIN entries e ON e.habit_id = h.id
+        WHERE h.user_id = ? {board_filter}
+        ORDER BY e.date
+    ''', _params(user_id, board_id))
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        dates, cells = [], [[] for _ in habits]
+        current = None
+        for day, habit_id, value, num_value in cursor:
+            if day != current:
+                if len(dates) >= batch_days:
+                    flush(writer, dates, cells)
+                    dates, cells = [], [[] for _ in habits]
+                current = day
+                dates.append(date.fromisoformat(day))
+                for column in cells:
+                    column.append(None)
+            i = position[habit_id]
+            cells[i][-1] = value if categorical[i] else num_value
+        if dates or not habits:
+            flush(writer, dates, cells)
+
+
+def iter_parquet(conn, user_id, board_id=None, chunk_size=64 * 1024):
+    """
+    Return a generator yielding a Parquet export in chunks, spooled through
+    a temporary file.
+
+    Raises:
+        ImportError: Straight away, before anything is streamed, if pyarrow
+            isn't installed
+    """
+    _import_pyarrow()
+    return _stream_parquet(conn, user_id, board_id, chunk_size)
+
+
+def _stream_parquet(conn, user_id, board_id, chunk_size):
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        write_parquet(conn, spool, user_id, board_id)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
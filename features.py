@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+# Derived features for model training: lagged values, rolling window
+# statistics and streak lengths of each numeric/boolean feature habit, plus
+# day-of-week indicators.
+#
+# Everything is computed on a daily calendar, so a lag of 1 is yesterday
+# even when yesterday wasn't logged, and rolling windows cover calendar days
+# rather than logged rows. Each habit's derived columns are cached against
+# its data_version, so repeated model runs only recompute habits that
+# changed. numpy and pandas are imported inside the functions that use them.
+
+STATS = ('mean', 'sum', 'std')
+DAYS_OF_WEEK = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MAX_DAYS = 365
+MAX_VALUES = 5
+
+
+def _int_list(raw, label, minimum):
+    values = []
+    for part in raw.replace(',', ' ').split():
+        try:
+            value = int(part)
+        except ValueError:
+            raise ValueError(f"'{part}' is not a whole number of days")
+        if not minimum <= value <= MAX_DAYS:
+            raise ValueError(f'Each {label} must be between {minimum} and {MAX_DAYS} days')
+        values.append(value)
+    values = sorted(set(values))
+    if len(values) > MAX_VALUES:
+        raise ValueError(f'Use at most {MAX_VALUES} {label}s')
+    return values
+
+
+def parse_options(form):
+    """
+    Read the feature options from the models form.
+
+    Returns:
+        options: Dictionary of 'lags', 'windows', 'stats', 'day_of_week' and
+            'streaks', or None if no derived features were asked for
+
+    Raises:
+        ValueError: If a lag or window isn't a sensible number of days
+    """
+    windows = _int_list(form.get('windows', ''), 'rolling window', 2)
+    stats = [stat for stat in STATS if stat in form.getlist('rolling_stats')]
+    options = {
+        'lags': _int_list(form.get('lags', ''), 'lag', 1),
+        'windows': windows,
+        'stats': (stats or ['mean']) if windows else [],
+        'day_of_week': bool(form.get('day_of_week')),
+        'streaks': bool(form.get('streaks')),
+    }
+    return options if any(options.values()) else None
+
+
+def habit_features(dates, values, name, options):
+    """
+    Derived columns for one habit.
+
+    Args:
+        dates: Sorted datetime64[D] array of the days the habit was logged
+        values: The logged values on those days
+        name: Habit name, used to label the columns
+        options: Dictionary from parse_options
+
+    Returns:
+        frame: DataFrame indexed by every calendar day from the first to the
+            last logged day ('YYYY-MM-DD' strings), one column per feature
+    """
+    import numpy as np
+    import pandas as pd
+
+    calendar = pd.date_range(dates[0], dates[-1], freq='D')
+    daily = np.full(len(calendar), np.nan)
+    daily[(dates - dates[0]).astype(int)] = values
+    series = pd.Series(daily, index=calendar)
+
+    columns = {}
+    for lag in options['lags']:
+        columns[f'{name} ({lag}d ago)'] = series.shift(lag)
+    for window in options['windows']:
+        # Unlogged days are skipped, so a 7-day sum adds up the days logged
+        # in the last week
+        rolling = series.rolling(window, min_periods=1)
+        for stat in options['stats']:
+            columns[f'{name} ({window}-day {stat})'] = getattr(rolling, stat)()
+    if options['streaks']:
+        # Days in a row with a non-zero value, ending on each day: the
+        # distance back to the most recent day that broke the run. Unlogged
+        # days count as zero; negative values keep the run going, as in the
+        # rollup streaks
+        active = np.nan_to_num(daily) != 0
+        days = np.arange(len(daily))
+        last_break = np.maximum.accumulate(np.where(active, -1, days))
+        columns[f'{name} (streak)'] = days - last_break
+
+    frame = pd.DataFrame(columns, index=calendar.strftime('%Y-%m-%d'))
+    return frame
+
+
+def day_of_week_features(dates):
+    """One-hot day-of-week columns for 'YYYY-MM-DD' dates."""
+    import numpy as np
+    import pandas as pd
+
+    weekdays = pd.to_datetime(dates).dayofweek.to_numpy()
+    one_hot = np.zeros((len(dates), len(DAYS_OF_WEEK)))
+    one_hot[np.arange(len(dates)), weekdays] = 1
+    return pd.DataFrame(one_hot, index=dates, columns=[f'Day of week_{day}' for day in DAYS_OF_WEEK])
+
+
+class FeatureCache:
+    """
+    In-process LRU cache of each habit's derived feature columns.
+
+    Entries are keyed on the habit's id, data_version and the feature
+    options; logging, editing or deleting an entry bumps the data_version,
+    so the habit's features are rebuilt on the next model run.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, habit, dates, values, options):
+        key = (habit['id'], habit['data_version'], habit['name'],
+               tuple((name, tuple(value) if isinstance(value, list) else value)
+                     for name, value in sorted(options.items())))
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self._stats['hits'] += 1
+                return frame
+            self._stats['misses'] += 1
+
+        frame = habit_features(dates, values, habit['name'], options)
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+        return frame
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._frames))
+
+
+def get_cache(app=None):
+    app = app or current_app
+    return app.extensions['feature_cache']
+
+
+def init_app(app):
+    app.config.setdefault('FEATURE_CACHE_ENTRIES', 512)
+    app.extensions['feature_cache'] = FeatureCache(app.config['FEATURE_CACHE_ENTRIES'])
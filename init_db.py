@@ -1,9 +1,7 @@
-import sqlite3
+import config
+import migrations
 
-connection = sqlite3.connect('habits.db')
-
-with open('schema.sql') as f:
-    connection.executescript(f.read())
-
-connection.commit()
-connection.close()
\ No newline at end of file
+# Creates the database (HABITS_DATABASE, by default habits.db next to this
+# file) on first run and upgrades an existing one in place
+for version, description in migrations.migrate(config.Config().DATABASE):
+    print(f'Applied migration {version}: {description}')
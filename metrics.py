@@ -0,0 +1,275 @@
+import cProfile
+import hmac
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+
+import db
+
+# Request and SQL instrumentation, exported in Prometheus text format.
+#
+# Every request is timed and labelled with its route (the URL rule, so
+# /habit/3 and /habit/4 are one series). Pooled connections are
+# TimedConnections, which add each statement's execute time to the current
+# request's totals; the per-request query count and SQL time are recorded
+# per route and sent back in a Server-Timing header, so a page that
+# suddenly runs hundreds of queries stands out in the browser's dev tools
+# as well as in /metrics. span() times blocks of work such as model
+# training.
+#
+# /metrics is only served to scrapers sending METRICS_TOKEN as a bearer
+# token or, with no token set, to clients on this machine.
+#
+# Setting PROFILE_SLOW_REQUESTS_MS runs every request under cProfile and
+# writes a .prof file to PROFILE_DIR for each one slower than that. The
+# profiler roughly doubles request time, so leave it off unless you're
+# chasing a slow page.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SPAN_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """A Prometheus histogram with one series per combination of label values."""
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # One count per bucket (not cumulative), then sum and count
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label_values, series in items:
+            labels = ''.join(f'{name}="{_escape(value)}",' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {series[-1]}')
+            labels = labels.rstrip(',')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return lines
+
+
+class Metrics:
+    """The app's histograms, plus a counter of profiles written."""
+
+    def __init__(self):
+        self.latency = Histogram('http_request_duration_seconds', 'Request latency by route.',
+                                 ('method', 'route', 'status'), LATENCY_BUCKETS)
+        self.queries = Histogram('http_request_queries', 'SQL statements executed per request.',
+                                 ('method', 'route'), QUERY_BUCKETS)
+        self.sql_time = Histogram('http_request_sql_seconds', 'Time spent executing SQL per request.',
+                                  ('method', 'route'), LATENCY_BUCKETS)
+        self.spans = Histogram('span_duration_seconds', 'Duration of timed blocks of work, e.g. model training.',
+                               ('name',), SPAN_BUCKETS)
+        self.profiles_written = 0
+
+    def observe_span(self, name, seconds):
+        self.spans.observe(seconds, name)
+
+    def render(self, stats=None):
+        """
+        The metrics in Prometheus text format.
+
+        Args:
+            stats: Optional dictionary of {component: stats dictionary}, e.g.
+                the connection pool's stats(); every numeric value is
+                exported as habits_<component>_<key>
+        """
+        lines = []
+        for histogram in (self.latency, self.queries, self.sql_time, self.spans):
+            lines.extend(histogram.render())
+        lines.append('# TYPE profiles_written_total counter')
+        lines.append(f'profiles_written_total {self.profiles_written}')
+        for component, values in (stats or {}).items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = re.sub(r'[^a-zA-Z0-9_]', '_', f'habits_{component}_{key}')
+                    lines.append(f'# TYPE {name} untyped')
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def record_query(seconds):
+    """Add one statement to the current request's SQL totals, if there is a request."""
+    if has_app_context():
+        totals = g.get('_metrics_sql')
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += seconds
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that reports every statement to record_query.
+
+    Only execute is timed; for a SELECT that covers running the statement up
+    to its first row, and rows fetched afterwards aren't counted.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(time.perf_counter() - start)
+
+
+@contextmanager
+def span(name):
+    """Time a block of work, e.g. `with metrics.span('train_model'): ...`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_app_context():
+            get_metrics().observe_span(name, time.perf_counter() - start)
+
+
+def get_metrics(app=None):
+    app = app or current_app
+    return app.extensions['metrics']
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_sql = [0, 0.0]
+    if current_app.config['PROFILE_SLOW_REQUESTS_MS'] is not None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running (e.g. in a debugger)
+            profiler = None
+        g._metrics_profiler = profiler
+
+
+def _after_request(response):
+    start = g.get('_metrics_start')
+    if start is not None:
+        count, sql_seconds = g._metrics_sql
+        elapsed = time.perf_counter() - start
+        response.headers['Server-Timing'] = (f'sql;dur={sql_seconds * 1000:.1f};desc="{count} queries", '
+                                             f'app;dur={elapsed * 1000:.1f}')
+        g._metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exception=None):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    profiler = g.pop('_metrics_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+    metrics = get_metrics()
+    method, route = request.method, _route()
+    count, sql_seconds = g.pop('_metrics_sql')
+    metrics.latency.observe(elapsed, method, route, str(g.pop('_metrics_status', 500)))
+    metrics.queries.observe(count, method, route)
+    metrics.sql_time.observe(sql_seconds, method, route)
+
+    threshold = current_app.config['PROFILE_SLOW_REQUESTS_MS']
+    if profiler is not None and elapsed * 1000 >= threshold:
+        _dump_profile(profiler, metrics, elapsed, count)
+
+
+def _dump_profile(profiler, metrics, elapsed, query_count):
+    directory = current_app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    endpoint = request.endpoint or 'unmatched'
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{endpoint}-"
+                                   f"{elapsed * 1000:.0f}ms.prof")
+    profiler.dump_stats(path)
+    metrics.profiles_written += 1
+    logger.warning('%s %s took %.0f ms (%d queries); profile written to %s',
+                   request.method, request.path, elapsed * 1000, query_count, path)
+
+
+def scrape_allowed():
+    """Whether the current request may read /metrics."""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(given.strip().encode(), token.encode())
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+def init_app(app):
+    """Register the request hooks. Call after db.init_app, whose pool it instruments."""
+    app.config.setdefault('METRICS_SQL', True)
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('PROFILE_SLOW_REQUESTS_MS', None)
+    app.config.setdefault('PROFILE_DIR', 'profiles')
+
+    app.extensions['metrics'] = Metrics()
+    if app.config['METRICS_SQL']:
+        db.get_pool(app).factory = TimedConnection
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,277 @@
+import argparse
+import os
+import sqlite3
+
+# Schema changes are applied in order and recorded in SQLite's built-in
+# user_version header field, so an existing habits.db is upgraded in place
+# instead of being dropped and recreated.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+@migration(1, 'baseline schema')
+def baseline_schema(conn):
+    schema_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+    with open(schema_path) as f:
+        for statement in f.read().split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+
+@migration(2, 'indexes for hot entry/habit lookups')
+def add_indexes(conn):
+    # Older versions of log_habit could store several entries for the same
+    # day. Keep the most recent one so the unique index can be built; the
+    # others are moved to entries_duplicates rather than lost.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS entries_duplicates AS
+        SELECT *, CURRENT_TIMESTAMP AS archived FROM entries WHERE 0
+    ''')
+    superseded = 'id NOT IN (SELECT MAX(id) FROM entries GROUP BY habit_id, date)'
+    conn.execute(f'INSERT INTO entries_duplicates SELECT *, CURRENT_TIMESTAMP FROM entries WHERE {superseded}')
+    conn.execute(f'DELETE FROM entries WHERE {superseded}')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_habit_date ON entries (habit_id, date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_habits_user ON habits (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_habits_board ON habits (board_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_habit_boards_user ON habit_boards (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_habit_options_habit ON habit_options (habit_id)')
+
+
+def _to_number_v3(variable_type, value):
+    # entries.to_number as it was when migration 3 was written. Kept here so
+    # later changes to the write path can't change what the backfill does.
+    if value is None:
+        return None
+    if variable_type == 'boolean':
+        return 1.0 if str(value).strip().lower() in ('true', '1', 'yes') else 0.0
+    if variable_type == 'numeric':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+@migration(3, 'typed entry values')
+def typed_entry_values(conn):
+    conn.execute('ALTER TABLE entries ADD COLUMN num_value REAL')
+    conn.execute('ALTER TABLE entries ADD COLUMN option_id INTEGER REFERENCES habit_options (id)')
+    conn.create_function('to_number', 2, _to_number_v3, deterministic=True)
+    conn.execute('''
+        UPDATE entries
+        SET num_value = to_number((SELECT variable_type FROM habits WHERE id = entries.habit_id), value)
+    ''')
+    conn.execute('''
+        UPDATE entries SET option_id = (
+            SELECT o.id FROM habit_options o
+            WHERE o.habit_id = entries.habit_id AND o.option_value = entries.value
+        )
+        WHERE habit_id IN (SELECT id FROM habits WHERE variable_type = 'categorical')
+    ''')
+
+
+@migration(4, 'per-habit data version')
+def habit_data_version(conn):
+    # Bumped on every write to a habit's entries; anything derived from the
+    # entries (trained models, caches) can be keyed on it
+    conn.execute('ALTER TABLE habits ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0')
+
+
+
+@migration(5, 'weekly and monthly habit rollups')
+def habit_rollups(conn):
+    conn.execute('''
+        CREATE TABLE habit_rollups (
+            habit_id INTEGER NOT NULL REFERENCES habits (id),
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            num_count INTEGER NOT NULL,
+            sum REAL,
+            min REAL,
+            max REAL,
+            last_value TEXT,
+            streak INTEGER NOT NULL,
+            PRIMARY KEY (habit_id, period, bucket)
+        ) WITHOUT ROWID
+    ''')
+    # Filled with a copy of the rollups.py summary SQL as it was when this
+    # migration was written, so later changes there can't change it
+    for period, bucket in (('week', "date(date, '-6 days', 'weekday 1')"),
+                           ('month', "strftime('%Y-%m-01', date)")):
+        conn.execute(f'''
+            WITH scoped AS (
+                SELECT habit_id, {bucket} AS bucket, date, value, num_value,
+                       ROW_NUMBER() OVER (PARTITION BY habit_id, {bucket} ORDER BY date DESC) AS recency
+                FROM entries
+            ),
+            runs AS (
+                SELECT habit_id, bucket, COUNT(*) AS length
+                FROM (
+                    SELECT habit_id, bucket,
+                           julianday(date) - ROW_NUMBER() OVER (PARTITION BY habit_id, bucket ORDER BY date) AS run
+                    FROM scoped
+                    WHERE num_value IS NULL OR num_value != 0
+                )
+                GROUP BY habit_id, bucket, run
+            ),
+            streaks AS (
+                SELECT habit_id, bucket, MAX(length) AS streak FROM runs GROUP BY habit_id, bucket
+            ),
+            totals AS (
+                SELECT habit_id, bucket, COUNT(*) AS count, COUNT(num_value) AS num_count,
+                       SUM(num_value) AS sum, MIN(num_value) AS min, MAX(num_value) AS max,
+                       MAX(CASE WHEN recency = 1 THEN value END) AS last_value
+                FROM scoped
+                GROUP BY habit_id, bucket
+            )
+            INSERT INTO habit_rollups (habit_id, period, bucket, count, num_count, sum, min, max, last_value, streak)
+            SELECT t.habit_id, '{period}', t.bucket, t.count, t.num_count, t.sum, t.min, t.max,
+                   t.last_value, COALESCE(s.streak, 0)
+            FROM totals t
+            LEFT JOIN streaks s ON s.habit_id = t.habit_id AND s.bucket = t.bucket
+        ''')
+
+
+@migration(6, 'API tokens')
+def api_tokens(conn):
+    # Only a SHA-256 of each token is stored; the token itself is shown once
+    conn.execute('''
+        CREATE TABLE api_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            name TEXT,
+            token_hash TEXT NOT NULL UNIQUE,
+            created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+@migration(7, 'shared training job state')
+def training_jobs(conn):
+    # Model training jobs, visible to every web worker process. The result
+    # holds the JSON the results page renders; trained models themselves
+    # go to the model cache.
+    conn.execute('''
+        CREATE TABLE training_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            status TEXT NOT NULL,
+            context TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_training_jobs_user_status ON training_jobs (user_id, status)')
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(database, target=None):
+    """
+    Bring a database up to date, one transaction per migration.
+
+    Args:
+        database: Path to the SQLite database file
+        target: Optional version to stop at (defaults to the latest)
+
+    Returns:
+        applied: List of (version, description) tuples that were applied
+    """
+    conn = sqlite3.connect(database, timeout=30, isolation_level=None)
+    applied = []
+    try:
+        for version, description, fn in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            # BEGIN IMMEDIATE takes the write lock up front so two processes
+            # starting at once can't both apply the same migration.
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if current_version(conn) >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                fn(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append((version, description))
+    finally:
+        conn.close()
+    return applied
+
+
+# Queries on the request path that must be answered from an index. Each is
+# checked with EXPLAIN QUERY PLAN; a full scan of the table means an index
+# went missing or a query stopped matching it.
+HOT_QUERIES = {
+    'entries by habit': ('SELECT * FROM entries WHERE habit_id = ? ORDER BY date', (1,)),
+    'entries by habit desc': ('SELECT * FROM entries WHERE habit_id = ? ORDER BY date DESC', (1,)),
+    'entries in date range': ('SELECT date, value FROM entries WHERE habit_id = ? AND date BETWEEN ? AND ? ORDER BY date',
+                              (1, '2024-01-01', '2024-12-31')),
+    'entry page after cursor': ('SELECT * FROM entries WHERE habit_id = ? AND (date, id) < (?, ?) '
+                                'ORDER BY date DESC, id DESC LIMIT ?', (1, '2024-01-01', 1, 51)),
+    'last entry date': ('SELECT date FROM entries WHERE habit_id = ? ORDER BY date DESC LIMIT 1', (1,)),
+    'entry for day': ('SELECT id FROM entries WHERE habit_id = ? AND date = ?', (1, '2024-01-01')),
+    'habits by user': ('SELECT * FROM habits WHERE user_id = ?', (1,)),
+    'habits by board': ('SELECT * FROM habits WHERE board_id = ?', (1,)),
+    'boards by user': ('SELECT * FROM habit_boards WHERE user_id = ?', (1,)),
+    'options by habit': ('SELECT option_value FROM habit_options WHERE habit_id = ?', (1,)),
+    'rollups in date range': ('SELECT bucket, sum, num_count FROM habit_rollups '
+                              'WHERE habit_id = ? AND period = ? AND bucket BETWEEN ? AND ? ORDER BY bucket',
+                              (1, 'week', '2024-01-01', '2024-12-31')),
+}
+
+
+def check_query_plans(conn):
+    """
+    Verify that every query in HOT_QUERIES uses an index.
+
+    Returns:
+        plans: Dictionary mapping query name to its plan details
+
+    Raises:
+        AssertionError: If any query falls back to a full table scan or a
+            temporary b-tree for sorting
+    """
+    plans = {}
+    problems = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        details = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+        plans[name] = details
+        for detail in details:
+            if detail.startswith('SCAN') or 'TEMP B-TREE' in detail:
+                problems.append(f'{name}: {detail}')
+    if problems:
+        raise AssertionError('Query plan regression:\n' + '\n'.join(problems))
+    return plans
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply schema migrations to a habits database.')
+    parser.add_argument('--database', default='habits.db')
+    parser.add_argument('--check', action='store_true', help='verify hot queries use indexes')
+    args = parser.parse_args()
+
+    for version, description in migrate(args.database):
+        print(f'Applied migration {version}: {description}')
+
+    conn = sqlite3.connect(args.database)
+    if args.check:
+        for name, details in check_query_plans(conn).items():
+            print(f'{name}: {"; ".join(details)}')
+    print(f'Database is at version {current_version(conn)}')
+    conn.close()
@@ -2,14 +2,19 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.svm import SVR, SVC
-from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.linear_model import LinearRegression, LogisticRegression, SGDClassifier, SGDRegressor
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, accuracy_score
+from sklearn.model_selection import TimeSeriesSplit, train_test_split
+from sklearn.metrics import accuracy_score, r2_score
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
-import random
+from sklearn.base import is_classifier
+from scipy.optimize import LinearConstraint, differential_evolution
+from joblib import Parallel, delayed
+import search as search_backends
+import hashlib
+import time
 from datetime import datetime, timedelta
 
 def preprocess_data(data):
@@ -24,144 +29,355 @@ def preprocess_data(data):
         y: Target vector
         feature_names: List of feature names
     """
-    # Create a dataframe for the target
-    target_df = pd.DataFrame({
-        'date': data['target']['dates'],
-        'target': data['target']['values']
-    })
-    
-    # Create dataframes for each feature
-    feature_dfs = []
+    # Collect every feature as (dates, 2-D block of values) so they can all
+    # be aligned against a single date index
+    blocks = []
     feature_names = []
     
     for feature in data['features']:
         if feature['type'] == 'categorical':
-            # For categorical features, we'll need to one-hot encode them
-            unique_values = list(set([val for sublist in feature['values'] for val in sublist]))
-            for i, val in enumerate(unique_values):
-                col_name = f"{feature['name']}_{val}"
-                feature_names.append(col_name)
-                feature_df = pd.DataFrame({
-                    'date': feature['dates'],
-                    col_name: [values[i] for values in feature['values']]
-                })
-                feature_dfs.append(feature_df)
+            if not feature['values']:
+                continue
+            # Categorical values arrive one-hot encoded; one column per category
+            values = np.asarray(feature['values'], dtype=float).reshape(len(feature['dates']), -1)
+            categories = feature.get('categories') or list(range(values.shape[1]))
+            feature_names.extend(f"{feature['name']}_{val}" for val in categories)
         else:
             # For numeric and boolean features
-            col_name = feature['name']
-            feature_names.append(col_name)
-            feature_df = pd.DataFrame({
-                'date': feature['dates'],
-                col_name: feature['values']
-            })
-            feature_dfs.append(feature_df)
+            values = np.asarray(feature['values'], dtype=float).reshape(-1, 1)
+            feature_names.append(feature['name'])
+        blocks.append((feature['dates'], values))
+    
+    # Build the sorted union of dates once, then drop each block into a
+    # preallocated matrix at the rows its dates map to
+    all_dates = sorted(set(data['target']['dates']).union(*(dates for dates, _ in blocks)))
+    row_of = {d: i for i, d in enumerate(all_dates)}
+    
+    def rows_for(dates):
+        return np.fromiter(map(row_of.__getitem__, dates), dtype=np.intp, count=len(dates))
+    
+    matrix = np.full((len(all_dates), len(feature_names) + 1), np.nan)
+    matrix[rows_for(data['target']['dates']), 0] = data['target']['values']
+    col = 1
+    for dates, values in blocks:
+        matrix[rows_for(dates), col:col + values.shape[1]] = values
+        col += values.shape[1]
     
-    # Merge all dataframes on date
-    merged_df = target_df
-    for df in feature_dfs:
-        merged_df = pd.merge(merged_df, df, on='date', how='outer')
+    merged_df = pd.DataFrame(matrix, columns=['target'] + feature_names)
     
     # Handle missing values
-    merged_df = merged_df.fillna(method='ffill').fillna(method='bfill')
+    merged_df = merged_df.ffill().bfill()
     
     # Split into features and target
-    X = merged_df.drop(['date', 'target'], axis=1)
+    X = merged_df.drop(['target'], axis=1)
     y = merged_df['target']
     
     return X, y, feature_names
 
-def train_model(X, y, model_type, is_classification=False):
+MODEL_TYPES = ('random_forest', 'svm', 'linear_regression')
+
+# Model types that can be updated with new days instead of retrained; an SVM
+# has no way to learn from extra rows without refitting on all of them
+INCREMENTAL_MODEL_TYPES = ('random_forest', 'linear_regression')
+
+def make_model(model_type, is_classification=False, incremental=False):
+    """
+    Build an untrained model.
+    
+    In incremental mode linear models are online learners (SGDRegressor, or
+    SGDClassifier with a logistic loss) that update_model can feed new days
+    with partial_fit, and random forests keep their trees between fits so
+    update_model can grow more.
+    
+    Args:
+        model_type: Type of model ('random_forest', 'svm', 'linear_regression')
+        is_classification: Whether this is a classification problem
+        incremental: Whether the model will be updated with update_model
+        
+    Returns:
+        model: Unfitted scikit-learn estimator
+    """
+    if is_classification:
+        if model_type == 'random_forest':
+            return RandomForestClassifier(n_estimators=100, random_state=42, warm_start=incremental)
+        elif model_type == 'svm':
+            return SVC(probability=True, random_state=42)
+        elif incremental:
+            return SGDClassifier(loss='log_loss', random_state=42)
+        else:  # linear_regression (actually logistic for classification)
+            return LogisticRegression(random_state=42)
+    
+    if model_type == 'random_forest':
+        return RandomForestRegressor(n_estimators=100, random_state=42, warm_start=incremental)
+    elif model_type == 'svm':
+        return SVR()
+    elif incremental:
+        return SGDRegressor(random_state=42)
+    else:  # linear_regression
+        return LinearRegression()
+
+def score_model(model, X_test, y_test, is_classification=False):
+    """Accuracy for classifiers, R^2 for regressors."""
+    y_pred = model.predict(X_test)
+    if is_classification:
+        return accuracy_score(y_test, y_pred)
+    return r2_score(y_test, y_pred)
+
+def train_model(X, y, model_type, is_classification=False, incremental=False):
     """
     Train a machine learning model.
     
+    The most recent 20% of days are held out for testing. Rows are in date
+    order, so a shuffled split would train on days that come after the ones
+    it is tested on and overstate how well the model predicts.
+    
     Args:
-        X: Feature matrix
+        X: Feature matrix, one row per day in date order
         y: Target vector
         model_type: Type of model to train ('random_forest', 'svm', 'linear_regression')
         is_classification: Whether this is a classification problem
+        incremental: Build a model update_model can update (see make_model)
         
     Returns:
         model: Trained model
+        scaler: Scaler fitted on the training rows
         X_test: Test features
         y_test: Test targets
-        accuracy: Model accuracy or error
+        accuracy: Accuracy for classification, R^2 for regression
     """
-    # Split data into train and test sets
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    if is_classification and len(np.unique(y_train)) < 2:
+        # Every early day has the same outcome, so a chronological split
+        # leaves nothing to learn from; fall back to a shuffled split
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    # Scale features
+    # Scale features. The scaler is fitted on a plain array, as predictions
+    # during the schedule search pass arrays rather than DataFrames
     scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    X_train_scaled = scaler.fit_transform(np.asarray(X_train, dtype=float))
+    X_test_scaled = scaler.transform(np.asarray(X_test, dtype=float))
     
-    # Select and train model
-    if is_classification:
-        if model_type == 'random_forest':
-            model = RandomForestClassifier(n_estimators=100, random_state=42)
-        elif model_type == 'svm':
-            model = SVC(probability=True, random_state=42)
-        else:  # linear_regression (actually logistic for classification)
-            model = LogisticRegression(random_state=42)
+    model = make_model(model_type, is_classification, incremental)
+    model.fit(X_train_scaled, y_train)
+    accuracy = score_model(model, X_test_scaled, y_test, is_classification)
+    
+    return model, scaler, X_test, y_test, accuracy
+
+def walk_forward_splits(n_samples, n_splits=5, min_test_size=3):
+    """
+    Expanding-window splits over rows in date order: each fold trains on
+    every day before its test window and tests on the next block of days.
+    
+    Returns:
+        splits: List of (train indices, test indices); empty if there are
+            too few rows for two folds of at least min_test_size days
+    """
+    n_splits = min(n_splits, n_samples // min_test_size - 1)
+    if n_splits < 2:
+        return []
+    return list(TimeSeriesSplit(n_splits=n_splits).split(np.arange(n_samples)))
+
+def _fit_and_score(model_type, is_classification, incremental, X, y, train_idx, test_idx):
+    scaler = StandardScaler().fit(X[train_idx])
+    try:
+        model = make_model(model_type, is_classification, incremental)
+        model.fit(scaler.transform(X[train_idx]), y[train_idx])
+        return float(score_model(model, scaler.transform(X[test_idx]), y[test_idx], is_classification))
+    except ValueError:
+        # e.g. a classifier whose training window only has one outcome
+        return float('nan')
+
+def walk_forward_validate(X, y, model_types=MODEL_TYPES, is_classification=False, n_splits=5, n_jobs=-1,
+                          incremental=False):
+    """
+    Score model types with walk-forward validation.
+    
+    Every (model type, fold) pair is fitted independently, so they all run
+    in one joblib Parallel call. It uses threads: this already runs inside a
+    training worker process, and scikit-learn releases the GIL while
+    fitting, whereas a nested process pool would copy X into every task and
+    keep the worker alive until its idle processes time out.
+    
+    Args:
+        X: Feature matrix indexed by date, rows in date order
+        y: Target vector
+        model_types: Model types to evaluate
+        is_classification: Whether this is a classification problem
+        n_splits: Maximum number of folds
+        n_jobs: Threads for joblib (-1 for one per CPU)
+        incremental: Score the incremental variant of each model type
         
-        model.fit(X_train_scaled, y_train)
-        y_pred = model.predict(X_test_scaled)
-        accuracy = accuracy_score(y_test, y_pred)
-    else:
-        if model_type == 'random_forest':
-            model = RandomForestRegressor(n_estimators=100, random_state=42)
-        elif model_type == 'svm':
-            model = SVR()
-        else:  # linear_regression
-            model = LinearRegression()
+    Returns:
+        evaluation: Dictionary with the 'metric' ('accuracy' or 'r2'), the
+            per-fold and mean scores of each model type under 'models', and
+            the 'best_model_type' by mean score (None if there were too few
+            rows to validate)
+    """
+    X_values = np.asarray(X, dtype=float)
+    y_values = np.asarray(y)
+    dates = [str(date)[:10] for date in X.index] if hasattr(X, 'index') else None
+    splits = walk_forward_splits(len(X_values), n_splits)
+    
+    tasks = [(model_type, fold, train_idx, test_idx)
+             for model_type in model_types
+             for fold, (train_idx, test_idx) in enumerate(splits)]
+    scores = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_fit_and_score)(model_type, is_classification, incremental, X_values, y_values, train_idx, test_idx)
+        for model_type, _, train_idx, test_idx in tasks)
+    
+    models = {model_type: {'model_type': model_type, 'folds': []} for model_type in model_types}
+    for (model_type, fold, train_idx, test_idx), score in zip(tasks, scores):
+        models[model_type]['folds'].append({
+            'fold': fold + 1,
+            'train_size': len(train_idx),
+            'test_size': len(test_idx),
+            'test_start': dates[test_idx[0]] if dates else None,
+            'test_end': dates[test_idx[-1]] if dates else None,
+            'score': None if np.isnan(score) else round(score, 4),
+        })
+    
+    best_model_type = None
+    for result in models.values():
+        fold_scores = [fold['score'] for fold in result['folds'] if fold['score'] is not None]
+        result['mean_score'] = round(float(np.mean(fold_scores)), 4) if fold_scores else None
+        if result['mean_score'] is not None and (
+                best_model_type is None or result['mean_score'] > models[best_model_type]['mean_score']):
+            best_model_type = result['model_type']
+    
+    return {
+        'metric': 'accuracy' if is_classification else 'r2',
+        'models': list(models.values()),
+        'best_model_type': best_model_type,
+    }
+
+def rows_checksum(X, y):
+    """Fingerprint of a block of training rows, to tell whether past days have changed since."""
+    digest = hashlib.sha1(np.ascontiguousarray(X, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=float).tobytes())
+    return digest.hexdigest()
+
+def incremental_state(X, y, trained_rows):
+    """
+    What update_model needs to know about a freshly trained model.
+    
+    Args:
+        X, y: Every row the model was built from, in date order
+        trained_rows: How many of the first rows it was fitted on; the rest
+            (the held-out test days) are fed to it by the first update
+    """
+    return {
+        'rows': len(X),
+        'trained_rows': trained_rows,
+        'checksum': rows_checksum(X, y),
+        'updates': 0,
+        'new_rows': 0,
+        'prequential_score': None,
+    }
+
+def update_model(model, scaler, X, y, state, is_classification=False,
+                 trees_per_update=10, max_trees=300, recent_rows=60):
+    """
+    Update a model made with incremental=True with the days added since it
+    was trained, without refitting on the whole history.
+    
+    The rows it has already seen must be unchanged (an edited or backfilled
+    day means retraining from scratch) and every new row must come after
+    them. Before learning from the new days the model is scored on them,
+    which gives a "test, then train" estimate of how it does on days it has
+    never seen.
+    
+    Linear models take the new days with partial_fit, and the scaler's mean
+    and variance are updated with running statistics to match. A random
+    forest grows trees_per_update new trees instead, fitted on the new days
+    or, if there are only a few, the last recent_rows days; beyond
+    max_trees its oldest trees are dropped, so the forest slowly forgets
+    habits the user no longer has. The forest's scaler stays as it was,
+    since its existing trees split on values scaled that way.
+    
+    Args:
+        model, scaler: Model and scaler from train_model(incremental=True)
+        X, y: The full, current feature matrix and target, in date order
+        state: The model's incremental_state, or that of its last update
+        is_classification: Whether this is a classification problem
         
-        model.fit(X_train_scaled, y_train)
-        y_pred = model.predict(X_test_scaled)
-        accuracy = 1 - (mean_squared_error(y_test, y_pred) / np.var(y_test))  # R^2 score
+    Returns:
+        model: The updated model (the same object, modified in place)
+        scaler: The scaler to use with it
+        state: New state to pass to the next update
+        
+    Raises:
+        ValueError: If the model can't be updated with these rows and should
+            be retrained instead
+    """
+    rows, trained_rows = state['rows'], state['trained_rows']
+    if len(X) < rows or rows_checksum(X.iloc[:rows], y.iloc[:rows]) != state['checksum']:
+        raise ValueError('Past days have changed since the model was trained')
+    X_new, y_new = X.iloc[trained_rows:].to_numpy(dtype=float), y.iloc[trained_rows:]
+    if len(X_new) == 0:
+        return model, scaler, state
     
-    return model, scaler, X_test, y_test, accuracy
+    prequential_score = None
+    if len(X_new) >= 2:
+        prequential_score = round(float(score_model(model, scaler.transform(X_new), y_new, is_classification)), 4)
+    
+    if hasattr(model, 'partial_fit'):
+        scaler.partial_fit(X_new)
+        model.partial_fit(scaler.transform(X_new), y_new)
+    elif getattr(model, 'warm_start', False):
+        start = min(trained_rows, max(0, len(X) - recent_rows))
+        X_fit, y_fit = X.iloc[start:].to_numpy(dtype=float), y.iloc[start:]
+        if is_classification and set(np.unique(y_fit)) != set(model.classes_):
+            # New trees that never saw one of the outcomes can't be
+            # averaged with the existing ones
+            raise ValueError('The recent days do not include every outcome')
+        keep = max_trees - trees_per_update
+        if len(model.estimators_) > keep:
+            model.estimators_ = model.estimators_[-keep:]
+        model.n_estimators = len(model.estimators_) + trees_per_update
+        model.fit(scaler.transform(X_fit), y_fit)
+    else:
+        raise ValueError(f'{type(model).__name__} models cannot be updated incrementally')
+    
+    return model, scaler, {
+        'rows': len(X),
+        'trained_rows': len(X),
+        'checksum': rows_checksum(X, y),
+        'updates': state['updates'] + 1,
+        'new_rows': len(X_new),
+        'prequential_score': prequential_score,
+    }
 
-def generate_recommendations(data, model, scaler, feature_names, optimization_goal):
+def generate_recommendations(X, model, scaler, feature_names, optimization_goal,
+                             layout=None, search='lhs', budget=1000, seed=42):
     """
     Generate recommendations based on the trained model.
     
     Args:
-        data: Dictionary containing target and features data
+        X: Feature matrix the model was trained on
         model: Trained model
         scaler: Feature scaler
         feature_names: List of feature names
         optimization_goal: 'maximize' or 'minimize'
+        layout: Optional per-habit column layout from
+            training_data.load_training_matrix; without it every column is
+            searched as a continuous value
+        search: Name of a backend in search.SEARCH_BACKENDS
+        budget: Number of model evaluations the search may use
+        seed: Random seed for the search
         
     Returns:
         recommendations: Dictionary with recommendations
     """
-    # Create a sample of possible feature combinations
-    n_samples = 1000
     n_features = len(feature_names)
+    is_classification = is_classifier(model)
+    sign = 1 if optimization_goal == 'maximize' else -1
     
-    # Generate random feature values within the observed ranges
-    X, y, _ = preprocess_data(data)
-    feature_mins = X.min()
-    feature_maxs = X.max()
-    
-    # Generate random samples
-    random_samples = np.random.rand(n_samples, n_features)
-    scaled_samples = random_samples * (feature_maxs - feature_mins).values + feature_mins.values
-    
-    # Scale the samples
-    scaled_samples = scaler.transform(scaled_samples)
-    
-    # Make predictions
-    predictions = model.predict(scaled_samples)
-    
-    # Find the best sample based on the optimization goal
-    if optimization_goal == 'maximize':
-        best_idx = np.argmax(predictions)
-    else:  # minimize
-        best_idx = np.argmin(predictions)
-    
-    best_sample = scaled_samples[best_idx]
-    best_sample_original = scaler.inverse_transform([best_sample])[0]
-    best_prediction = predictions[best_idx]
+    # Search for the feature values with the best predicted target. The
+    # space is bounded by the observed range of every feature.
+    space = search_backends.SearchSpace(X, layout)
+    best_sample, _ = search_backends.SEARCH_BACKENDS[search](
+        space, lambda rows: sign * predict_target(model, scaler, rows, is_classification), budget, seed=seed)
+    best_prediction = model.predict(scaler.transform([best_sample]))[0]
     
     # Calculate feature importance if the model supports it
     if hasattr(model, 'feature_importances_'):
@@ -169,14 +385,35 @@ def generate_recommendations(data, model, scaler, feature_names, optimization_go
     else:
         importances = np.ones(n_features) / n_features  # Equal importance if not available
     
-    # Create recommendations
+    if layout is None:
+        layout = [{'habit_id': None, 'name': name, 'type': 'numeric', 'columns': [i]}
+                  for i, name in enumerate(feature_names)]
+    
+    # Derived columns aren't something to act on today, but they count
+    # towards the importance of the habit they were computed from
+    derived_importance = {}
+    for habit in layout:
+        if habit['type'] == 'derived' and habit['habit_id'] is not None:
+            derived_importance[habit['habit_id']] = (derived_importance.get(habit['habit_id'], 0.0) +
+                                                     float(np.sum(importances[habit['columns']])))
+    
+    # Create recommendations, one per habit
     suggested_habits = []
-    for i, feature in enumerate(feature_names):
+    for habit in layout:
+        columns = habit['columns']
+        if habit['type'] == 'derived':
+            continue
+        elif habit['type'] == 'categorical':
+            recommendation = str(habit['categories'][int(np.argmax(best_sample[columns]))])
+        elif habit['type'] == 'boolean':
+            recommendation = 'Yes' if best_sample[columns[0]] >= 0.5 else 'No'
+        else:
+            recommendation = f"{best_sample[columns[0]]:.2f}"
         suggested_habits.append({
-            'habit_id': i + 1,  # Placeholder ID
-            'name': feature,
-            'recommendation': f"{best_sample_original[i]:.2f}" if isinstance(best_sample_original[i], (int, float)) else str(best_sample_original[i]),
-            'importance': importances[i]
+            'habit_id': habit['habit_id'],
+            'name': habit['name'],
+            'recommendation': recommendation,
+            'importance': float(np.sum(importances[columns])) + derived_importance.get(habit['habit_id'], 0.0)
         })
     
     # Sort habits by importance
@@ -191,81 +428,130 @@ def generate_recommendations(data, model, scaler, feature_names, optimization_go
     
     return recommendations
 
-def generate_optimized_schedule(target_habit_id, constraints, habits_data):
+def predict_target(model, scaler, samples, is_classification=False):
+    """
+    Predict the target for raw (unscaled) feature rows.
+    
+    For classifiers this is the probability of the positive class, which
+    gives the optimizer a smooth surface instead of a 0/1 step.
+    """
+    scaled = scaler.transform(np.asarray(samples, dtype=float))
+    if is_classification and hasattr(model, 'predict_proba'):
+        return model.predict_proba(scaled)[:, -1]
+    return model.predict(scaled)
+
+def generate_optimized_schedule(target_habit, feature_habits, X, model, scaler, constraints,
+                                is_classification=False, optimization_goal='maximize',
+                                time_units=None, time_budget=24.0, day_start=6.0,
+                                seed=42, time_limit=5.0):
     """
     Generate an optimized daily schedule based on target habit and constraints.
     
+    The schedule is found with differential evolution over the feature
+    habits' values, bounded by the user's constraints (or the observed range
+    where none were given), with boolean habits kept to 0/1 and the time
+    spent on habits measured in minutes or hours capped at time_budget.
+    
     Args:
-        target_habit_id: ID of the target habit
-        constraints: Dictionary of habit constraints
-        habits_data: Dictionary of habit data
+        target_habit: The habit being optimized
+        feature_habits: Habits matching the columns of X, in order
+        X: Feature matrix the model was trained on
+        model: Trained model of the target habit
+        scaler: Feature scaler used with the model
+        constraints: Dictionary of {habit_id: {'min': value, 'max': value}}
+        is_classification: Whether the target is boolean
+        optimization_goal: 'maximize' or 'minimize'
+        time_units: Dictionary of {habit_id: 'minutes' or 'hours'} for habits
+            that take up time in the day
+        time_budget: Hours available in the day
+        day_start: Hour the schedule starts at
+        seed: Random seed, so the same inputs give the same schedule
+        time_limit: Seconds after which the search stops with its best result
         
     Returns:
         schedule: Dictionary with the optimized schedule
     """
-    # This is a simplified implementation that creates a reasonable schedule
-    # In a real implementation, you would use optimization algorithms
-    
-    # Get the target habit name
-    target_habit = next((h for h in habits_data if h['id'] == int(target_habit_id)), None)
-    if not target_habit:
-        return None
-    
-    # Create a template schedule with common daily activities
-    schedule_template = [
-        {'time': '06:00', 'habit': 'Wake up', 'value': 'Yes'},
-        {'time': '06:30', 'habit': 'Morning routine', 'value': '30 minutes'},
-        {'time': '07:00', 'habit': 'Exercise', 'value': '45 minutes'},
-        {'time': '08:00', 'habit': 'Breakfast', 'value': 'Healthy meal'},
-        {'time': '09:00', 'habit': 'Deep work', 'value': '3 hours'},
-        {'time': '12:00', 'habit': 'Lunch', 'value': '45 minutes'},
-        {'time': '13:00', 'habit': 'Meetings/Calls', 'value': '2 hours'},
-        {'time': '15:00', 'habit': 'Deep work', 'value': '2 hours'},
-        {'time': '17:00', 'habit': 'Exercise', 'value': '30 minutes'},
-        {'time': '18:00', 'habit': 'Dinner', 'value': 'Balanced meal'},
-        {'time': '19:00', 'habit': 'Family/Social time', 'value': '2 hours'},
-        {'time': '21:00', 'habit': 'Wind down routine', 'value': '1 hour'},
-        {'time': '22:00', 'habit': 'Sleep', 'value': '8 hours'}
-    ]
-    
-    # Apply constraints to the schedule
-    for habit in habits_data:
-        habit_id = habit['id']
-        if habit_id in constraints:
-            constraint = constraints[habit_id]
-            habit_name = habit['name']
-            
-            # Find this habit in the schedule
-            schedule_item = next((item for item in schedule_template if item['habit'].lower() == habit_name.lower()), None)
-            
-            if schedule_item:
-                # Apply constraints
-                if 'min' in constraint and 'max' in constraint:
-                    # For numeric habits, take the average of min and max
-                    if habit['variable_type'] == 'numeric':
-                        value = (constraint['min'] + constraint['max']) / 2
-                        schedule_item['value'] = f"{value} {habit_name.split()[-1] if ' ' in habit_name else ''}"
-                    elif habit['variable_type'] == 'boolean':
-                        schedule_item['value'] = 'Yes' if constraint['min'] > 0 else 'No'
-                elif 'min' in constraint:
-                    if habit['variable_type'] == 'numeric':
-                        schedule_item['value'] = f"{constraint['min']} {habit_name.split()[-1] if ' ' in habit_name else ''}"
-                    elif habit['variable_type'] == 'boolean':
-                        schedule_item['value'] = 'Yes' if constraint['min'] > 0 else 'No'
-                elif 'max' in constraint:
-                    if habit['variable_type'] == 'numeric':
-                        schedule_item['value'] = f"{constraint['max']} {habit_name.split()[-1] if ' ' in habit_name else ''}"
-                    elif habit['variable_type'] == 'boolean':
-                        schedule_item['value'] = 'Yes' if constraint['max'] > 0 else 'No'
-    
-    # Calculate a predicted value for the target habit
-    # This would be based on a real model in a full implementation
-    predicted_value = random.uniform(7.5, 9.5)
+    time_units = time_units or {}
+    observed_min = X.min().to_numpy(dtype=float)
+    observed_max = X.max().to_numpy(dtype=float)
+    
+    bounds = []
+    hours_per_unit = np.zeros(len(feature_habits))
+    integrality = np.zeros(len(feature_habits), dtype=bool)
+    for i, habit in enumerate(feature_habits):
+        constraint = constraints.get(habit['id'], {})
+        low = constraint.get('min', observed_min[i])
+        high = constraint.get('max', observed_max[i])
+        if habit['variable_type'] == 'boolean':
+            low, high = max(low, 0), min(high, 1)
+            integrality[i] = True
+        if low > high:
+            raise ValueError(f"The minimum for {habit['name']} is above its maximum")
+        bounds.append((low, high))
+        if time_units.get(habit['id']) == 'minutes':
+            hours_per_unit[i] = 1 / 60
+        elif time_units.get(habit['id']) == 'hours':
+            hours_per_unit[i] = 1
+    
+    if hours_per_unit.dot([low for low, _ in bounds]) > time_budget:
+        raise ValueError(f'The minimum time for your habits is more than {time_budget:g} hours')
+    
+    sign = -1 if optimization_goal == 'maximize' else 1
+    
+    def objective(population):
+        # Called with the whole population at once (vectorized=True), so the
+        # model predicts every candidate in a single batch
+        return sign * predict_target(model, scaler, population.T, is_classification)
+    
+    deadline = time.monotonic() + time_limit
+    
+    def stop_at_deadline(xk, convergence=None):
+        return time.monotonic() > deadline
+    
+    search_constraints = ()
+    if hours_per_unit.any():
+        search_constraints = (LinearConstraint(hours_per_unit.reshape(1, -1), -np.inf, time_budget),)
+    
+    result = differential_evolution(objective, bounds,
+                                    constraints=search_constraints,
+                                    integrality=integrality,
+                                    vectorized=True,
+                                    updating='deferred',
+                                    seed=seed,
+                                    maxiter=200,
+                                    polish=False,
+                                    callback=stop_at_deadline)
+    best = result.x
+    best[integrality] = np.round(best[integrality])
+    predicted_value = float(predict_target(model, scaler, [best], is_classification)[0])
+    
+    # Lay out the habits that take up time back to back from day_start; the
+    # rest can be done at any point in the day
+    daily_plan = []
+    clock = day_start
+    for i, habit in enumerate(feature_habits):
+        value = best[i]
+        if hours_per_unit[i]:
+            if value <= 0:
+                continue
+            hours = value * hours_per_unit[i]
+            start = clock % 24
+            daily_plan.append({
+                'time': f"{int(start):02d}:{int(round((start % 1) * 60)) % 60:02d}",
+                'habit': habit['name'],
+                'value': f"{value:.0f} {time_units[habit['id']]}"
+            })
+            clock += hours
+        elif habit['variable_type'] == 'boolean':
+            daily_plan.append({'time': 'Any time', 'habit': habit['name'], 'value': 'Yes' if value >= 0.5 else 'No'})
+        else:
+            daily_plan.append({'time': 'Any time', 'habit': habit['name'], 'value': f"{value:.2f}"})
     
     schedule = {
         'target_habit': target_habit['name'],
-        'predicted_value': round(predicted_value, 1),
-        'daily_plan': schedule_template
+        'predicted_value': round(predicted_value, 2),
+        'hours_scheduled': round(float(hours_per_unit.dot(best)), 2),
+        'daily_plan': daily_plan
     }
     
-    return schedule 
\ No newline at end of file
+    return schedule
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def training_key(conn, target_habit_id, feature_habit_ids, model_type, **options):
+    """
+    Build the cache key for a training request.
+
+    The key covers the target, the features (in order, since that fixes the
+    column layout), the model type, any extra training options and the
+    current data_version of every habit involved. Logging, editing or
+    deleting an entry bumps its habit's data_version, so stale models are
+    never looked up again and simply age out of the cache.
+    """
+    habit_ids = [int(target_habit_id)] + [int(habit_id) for habit_id in feature_habit_ids]
+    placeholders = ','.join('?' * len(habit_ids))
+    versions = dict(conn.execute(
+        f'SELECT id, data_version FROM habits WHERE id IN ({placeholders})', habit_ids).fetchall())
+    return _key(habit_ids, model_type, options, versions=sorted(versions.items()))
+
+
+def lineage_key(target_habit_id, feature_habit_ids, model_type, **options):
+    """
+    Build a key like training_key's, but without the data versions.
+
+    It stays the same as new entries are logged, so the latest incremental
+    model for a training request, stored under it, can be found and updated
+    once its training_key has moved on.
+    """
+    habit_ids = [int(target_habit_id)] + [int(habit_id) for habit_id in feature_habit_ids]
+    return _key(habit_ids, model_type, options, lineage=True)
+
+
+def _key(habit_ids, model_type, options, **extra):
+    payload = dict({
+        'target': habit_ids[0],
+        'features': habit_ids[1:],
+        'model_type': model_type,
+        'options': options,
+    }, **extra)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class ModelCache:
+    """
+    On-disk LRU cache of trained models.
+
+    Each entry is one joblib file named after its key. joblib (and with it
+    numpy) is imported on first use rather than when the app starts. Reads touch the
+    file's mtime, and after every write the least recently used files are
+    removed until the cache fits within max_entries and max_bytes.
+    """
+
+    def __init__(self, directory, max_entries=64, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.joblib')
+
+    def get(self, key):
+        import joblib
+
+        path = self._path(key)
+        try:
+            value = joblib.load(path)
+            os.utime(path)
+        except FileNotFoundError:
+            # Not stored yet, or evicted by another worker
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        except Exception:
+            # Corrupt, or pickled by other versions of scikit-learn/numpy.
+            # Dropped so the model is retrained instead of failing every time
+            logger.exception('Discarding unreadable cached model %s', path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            self._stats['hits'] += 1
+        return value
+
+    def put(self, key, value):
+        import joblib
+
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+        with self._lock:
+            self._stats['stores'] += 1
+        self.evict()
+
+    def evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.joblib'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, name))
+        files.sort(reverse=True)  # Most recently used first
+
+        total = 0
+        for count, (_, size, name) in enumerate(files, start=1):
+            total += size
+            if count > self.max_entries or total > self.max_bytes:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                with self._lock:
+                    self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['entries'] = sum(1 for name in os.listdir(self.directory) if name.endswith('.joblib'))
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+def get_cache(app=None):
+    app = app or current_app
+    return app.extensions['model_cache']
+
+
+def init_app(app):
+    app.config.setdefault('MODEL_CACHE_DIR', 'model_cache')
+    app.config.setdefault('MODEL_CACHE_MAX_ENTRIES', 64)
+    app.config.setdefault('MODEL_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+    app.extensions['model_cache'] = ModelCache(app.config['MODEL_CACHE_DIR'],
+                                               max_entries=app.config['MODEL_CACHE_MAX_ENTRIES'],
+                                               max_bytes=app.config['MODEL_CACHE_MAX_BYTES'])
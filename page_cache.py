@@ -0,0 +1,218 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session
+
+# Cache of rendered pages that only change when their user writes something:
+# the dashboard, the board list, board pages and the stats page.
+#
+# Every user has a version token, replaced after each successful POST, PUT,
+# PATCH or DELETE made as that user through the site or the API. Pages are
+# stored under the token that was current when they were rendered, so one
+# write invalidates all of the user's pages and a repeat view is served
+# without touching the database. Pages also expire after PAGE_CACHE_TTL
+# seconds, which bounds how long a change made outside a request (e.g.
+# rollups.py run from the command line) can go unseen.
+#
+# Pages and tokens are kept in this process. With several worker processes
+# they have to share both through PAGE_CACHE_DIR, or a worker could keep
+# serving a page from before a write another worker handled until the page
+# expires; apps built with MULTIPROCESS set (as wsgi.py does) default it to a
+# directory next to the database. Use one directory per database.
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class PageCache:
+    """
+    In-process LRU cache of rendered pages with a time-to-live, optionally
+    backed by a directory shared with other processes.
+
+    Entries are keyed on the user and the request path; each remembers the
+    user's version token from when it was rendered and is only served while
+    that token is still current.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._pages = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _user_dir(self, user_id):
+        return os.path.join(self.directory, str(int(user_id)))
+
+    def _page_path(self, user_id, key, version):
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self._user_dir(user_id), f'{name}-{version}.page')
+
+    def version(self, user_id):
+        if self.directory is None:
+            with self._lock:
+                return self._versions.get(user_id, '')
+        try:
+            with open(os.path.join(self._user_dir(user_id), 'version')) as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def bump(self, user_id):
+        # A random token rather than a counter, so processes bumping the same
+        # user at once can never end up reusing an old version
+        version = secrets.token_hex(8)
+        with self._lock:
+            self._versions[user_id] = version
+            self._stats['invalidations'] += 1
+        if self.directory is None:
+            return version
+
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, exist_ok=True)
+        path = os.path.join(user_dir, 'version')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, path)
+        # Pages stored under any older version can never be served again
+        for name in os.listdir(user_dir):
+            if name.endswith('.page') and not name.endswith(f'-{version}.page'):
+                try:
+                    os.remove(os.path.join(user_dir, name))
+                except OSError:
+                    continue
+        return version
+
+    def get(self, user_id, key, version):
+        """
+        Look up a page.
+
+        Returns:
+            page: (body, content_type), or None if there is no page for this
+                version or it has expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._pages.get((user_id, key))
+            if entry is not None and entry[0] == version and now - entry[1] < self.ttl:
+                self._pages.move_to_end((user_id, key))
+                self._stats['hits'] += 1
+                return entry[2], entry[3]
+
+        if self.directory is not None:
+            path = self._page_path(user_id, key, version)
+            try:
+                stored_at = os.stat(path).st_mtime
+                if now - stored_at < self.ttl:
+                    with open(path, 'rb') as f:
+                        content_type, _, body = f.read().partition(b'\n')
+                    content_type = content_type.decode()
+                    self._remember(user_id, key, version, stored_at, body, content_type)
+                    with self._lock:
+                        self._stats['hits'] += 1
+                        self._stats['disk_hits'] += 1
+                    return body, content_type
+            except OSError:
+                pass  # Not stored, or removed by another worker's bump
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, user_id, key, version, body, content_type):
+        self._remember(user_id, key, version, time.time(), body, content_type)
+        with self._lock:
+            self._stats['stores'] += 1
+        if self.directory is None:
+            return
+
+        path = self._page_path(user_id, key, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content_type.encode() + b'\n' + body)
+        os.replace(tmp_path, path)  # Atomic, so readers never see a partial page
+
+    def _remember(self, user_id, key, version, stored_at, body, content_type):
+        with self._lock:
+            self._pages[(user_id, key)] = (version, stored_at, body, content_type)
+            self._pages.move_to_end((user_id, key))
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._pages))
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['shared'] = self.directory is not None
+        return stats
+
+
+def get_cache(app=None):
+    app = app or current_app
+    return app.extensions.get('page_cache')
+
+
+def cached(view):
+    """
+    Serve GET requests for a page from the cache of the logged-in user.
+
+    Goes below login_required. Only complete 200 responses are stored.
+    Pages are keyed on the path alone, so a client can't fill the cache by
+    varying the query string; don't use this on views that read
+    request.args.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        cache = get_cache()
+        # Pages with flashed messages waiting are rendered fresh, so each
+        # message is shown once and never stored with the page
+        if cache is None or request.method != 'GET' or '_flashes' in session:
+            return view(*args, **kwargs)
+
+        user_id = session['user_id']
+        key = request.path
+        version = cache.version(user_id)
+        page = cache.get(user_id, key, version)
+        if page is not None:
+            body, content_type = page
+            return current_app.response_class(body, content_type=content_type)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough and '_flashes' not in session:
+            cache.put(user_id, key, version, response.get_data(), response.content_type)
+        return response
+    return decorated_function
+
+
+def invalidate_after_write(response):
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        user_id = g.get('api_user_id') or session.get('user_id')
+        if user_id is not None:
+            get_cache().bump(user_id)
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('PAGE_CACHE_ENTRIES', 1024)
+    app.config.setdefault('PAGE_CACHE_TTL', 300)
+    app.config.setdefault('PAGE_CACHE_DIR', None)
+    app.config.setdefault('MULTIPROCESS', False)
+    if not app.config['PAGE_CACHE_ENTRIES']:
+        return  # Disabled
+    if app.config['PAGE_CACHE_DIR'] is None and app.config['MULTIPROCESS']:
+        app.config['PAGE_CACHE_DIR'] = os.path.splitext(app.config['DATABASE'])[0] + '_page_cache'
+    app.extensions['page_cache'] = PageCache(app.config['PAGE_CACHE_ENTRIES'],
+                                             ttl=app.config['PAGE_CACHE_TTL'],
+                                             directory=app.config['PAGE_CACHE_DIR'])
+    app.after_request(invalidate_after_write)
@@ -0,0 +1,201 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+import rollups
+
+# Bucket sizes for categorical plots, chosen from the width of the requested
+# range so the number of bars sent to the browser stays bounded however long
+# the history is. Each entry is (max days in range, bucket name, SQL
+# expression mapping an entry date to the first day of its bucket).
+BUCKETS = [
+    (120, 'day', 'date'),
+    (730, 'week', rollups.PERIODS['week']),
+    (None, 'month', rollups.PERIODS['month']),
+]
+
+# Numeric and boolean plots keep the daily values and are downsampled with
+# LTTB, which keeps the peaks that bucket means would flatten. Only ranges
+# too long to read every entry per request start from the weekly rollups.
+SERIES_BUCKETS = [
+    (3650, 'day', 'date'),
+    (None, 'week', rollups.PERIODS['week']),
+]
+
+BUCKET_LABELS = {'day': 'daily', 'week': 'weekly average', 'month': 'monthly average'}
+
+
+def validate_range(start_date, end_date):
+    """
+    Check a requested plot range.
+
+    Args:
+        start_date, end_date: ISO dates, or empty for the habit's first and
+            last entry
+
+    Raises:
+        ValueError: If a date is malformed or the range ends before it starts
+    """
+    start = date.fromisoformat(start_date) if start_date else None
+    end = date.fromisoformat(end_date) if end_date else None
+    if start and end and start > end:
+        raise ValueError('start_date is after end_date')
+
+
+def choose_bucket(start_date, end_date, buckets=BUCKETS):
+    days = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days
+    for max_days, name, expression in buckets:
+        if max_days is None or days <= max_days:
+            return name, expression
+
+
+def whole_buckets(period, start_date, end_date):
+    """
+    Narrow a date range to the buckets lying entirely inside it.
+
+    Returns:
+        start, end: ISO dates of the first day of the first whole bucket and
+            the last day of the last one; start is after end if there are none
+    """
+    first_start, first_end = rollups.bucket_range(period, start_date, start_date)
+    last_start, last_end = rollups.bucket_range(period, end_date, end_date)
+    if first_start != start_date:
+        start_date = (date.fromisoformat(first_end) + timedelta(days=1)).isoformat()
+    if last_end != end_date:
+        end_date = (date.fromisoformat(last_start) - timedelta(days=1)).isoformat()
+    return start_date, end_date
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket. Peaks and
+    troughs survive, unlike with plain averaging or striding.
+
+    Returns:
+        indices: Sorted indices of the points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def rolling_mean(values, window):
+    """Trailing mean over up to window points, computed with a cumulative sum."""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return values
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumsum[ends] - cumsum[starts]) / (ends - starts)
+
+
+def build_plot(conn, habit, start_date=None, end_date=None, max_points=500, window=7):
+    """
+    Build the Plotly data and layout for a habit over a date range.
+
+    Args:
+        conn: Database connection
+        habit: Habit row with 'id' and 'variable_type'
+        start_date, end_date: ISO dates; default to the habit's first and
+            last entry
+        max_points: Maximum number of points in a numeric/boolean trace
+        window: Rolling mean window, in buckets
+
+    Returns:
+        plot: Dictionary with 'data' and 'layout' for Plotly.newPlot
+    """
+    if not start_date or not end_date:
+        first, last = conn.execute('SELECT MIN(date), MAX(date) FROM entries WHERE habit_id = ?',
+                                   (habit['id'],)).fetchone()
+        start_date = start_date or first or date.today().isoformat()
+        end_date = end_date or last or date.today().isoformat()
+
+    layout = {'title': 'Habit Progress'}
+
+    if habit['variable_type'] == 'categorical':
+        # Count of each category per bucket, one stacked bar trace per category
+        bucket, expression = choose_bucket(start_date, end_date)
+        layout['xaxis'] = {'title': f'Date ({BUCKET_LABELS[bucket]})'}
+        rows = conn.execute(f'''
+            SELECT {expression} AS bucket, value, COUNT(*) AS n
+            FROM entries
+            WHERE habit_id = ? AND date BETWEEN ? AND ?
+            GROUP BY bucket, value
+            ORDER BY bucket
+        ''', (habit['id'], start_date, end_date)).fetchall()
+        traces = {}
+        for row in rows:
+            trace = traces.setdefault(row['value'], {'x': [], 'y': [], 'type': 'bar', 'name': row['value']})
+            trace['x'].append(row['bucket'])
+            trace['y'].append(row['n'])
+        layout['yaxis'] = {'title': 'Count'}
+        layout['barmode'] = 'stack'
+        return {'data': list(traces.values()), 'layout': layout}
+
+    # Numeric and boolean habits: the daily entries, or for very long ranges
+    # the mean per bucket. Whole buckets come straight from the rollup
+    # tables; the partial ones at either end are averaged from the entries
+    # inside the range, so nothing outside it is counted.
+    bucket, expression = choose_bucket(start_date, end_date, SERIES_BUCKETS)
+    layout['xaxis'] = {'title': f'Date ({BUCKET_LABELS[bucket]})'}
+    if bucket in rollups.PERIODS:
+        inner_start, inner_end = whole_buckets(bucket, start_date, end_date)
+        rows = conn.execute(f'''
+            SELECT bucket, sum / num_count AS value
+            FROM habit_rollups
+            WHERE habit_id = :habit_id AND period = :period AND bucket BETWEEN :inner_start AND :inner_end
+              AND num_count > 0
+            UNION ALL
+            SELECT {expression} AS bucket, AVG(num_value) AS value
+            FROM entries
+            WHERE habit_id = :habit_id AND date BETWEEN :start AND :end AND num_value IS NOT NULL
+              AND date NOT BETWEEN :inner_start AND :inner_end
+            GROUP BY bucket
+            ORDER BY bucket
+        ''', {'habit_id': habit['id'], 'period': bucket, 'start': start_date, 'end': end_date,
+              'inner_start': inner_start, 'inner_end': inner_end}).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT date AS bucket, num_value AS value
+            FROM entries
+            WHERE habit_id = ? AND date BETWEEN ? AND ? AND num_value IS NOT NULL
+            ORDER BY date
+        ''', (habit['id'], start_date, end_date)).fetchall()
+    dates = np.array([row['bucket'] for row in rows])
+    values = np.array([row['value'] for row in rows], dtype=float)
+    smoothed = rolling_mean(values, window)
+
+    keep = lttb(dates.astype('datetime64[D]').astype(np.int64).astype(float), values, max_points)
+    data = [{
+        'x': dates[keep].tolist(),
+        'y': values[keep].tolist(),
+        'type': 'scatter' if habit['variable_type'] == 'numeric' else 'bar',
+        'name': 'Value',
+    }, {
+        'x': dates[keep].tolist(),
+        'y': smoothed[keep].tolist(),
+        'type': 'scatter',
+        'mode': 'lines',
+        'name': f'{window}-point rolling mean',
+    }]
+    layout['yaxis'] = {'title': 'Value' if habit['variable_type'] == 'numeric' else 'Yes/No'}
+    return {'data': data, 'layout': layout}
@@ -0,0 +1,183 @@
+import argparse
+import json
+import sqlite3
+from datetime import date, timedelta
+
+# Per-habit weekly and monthly summaries of the entries table, so dashboards
+# and plots read one row per bucket instead of every entry. The entries.py
+# write helpers refresh the buckets they touch in the caller's transaction,
+# so the summaries never drift from the entries they were built from.
+#
+# Each period maps to the SQL expression giving the first day of an entry's
+# bucket: weeks start on Monday, months on the 1st.
+PERIODS = {
+    'week': "date(date, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', date)",
+}
+
+COLUMNS = 'habit_id, period, bucket, count, num_count, sum, min, max, last_value, streak'
+
+# The ranges to recompute, passed as a JSON array of [habit_id, first day,
+# last day] so a refresh takes the same two statements per period however
+# many habits it covers.
+TOUCHED_SQL = '''
+    touched(habit, first_day, last_day) AS (
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]')
+        FROM json_each(:ranges)
+    )
+'''
+
+DELETE_SQL = '''
+    WITH {touched}
+    DELETE FROM {table}
+    WHERE period = :period AND habit_id IN (SELECT habit FROM touched)
+      AND EXISTS (SELECT 1 FROM touched WHERE habit = habit_id AND bucket BETWEEN first_day AND last_day)
+'''
+
+# Recompute every bucket in the touched ranges. The streak is the longest run
+# of consecutive days in the bucket with an entry that isn't a zero/"No";
+# runs are found by subtracting each active day's row number from its day
+# number, which is constant within a run.
+REFRESH_SQL = '''
+    WITH {touched},
+    scoped AS (
+        SELECT e.habit_id, {bucket} AS bucket, e.date, e.value, e.num_value,
+               ROW_NUMBER() OVER (PARTITION BY e.habit_id, {bucket} ORDER BY e.date DESC) AS recency
+        FROM touched t
+        JOIN entries e ON e.habit_id = t.habit AND e.date BETWEEN t.first_day AND t.last_day
+    ),
+    runs AS (
+        SELECT habit_id, bucket, COUNT(*) AS length
+        FROM (
+            SELECT habit_id, bucket,
+                   julianday(date) - ROW_NUMBER() OVER (PARTITION BY habit_id, bucket ORDER BY date) AS run
+            FROM scoped
+            WHERE num_value IS NULL OR num_value != 0
+        )
+        GROUP BY habit_id, bucket, run
+    ),
+    streaks AS (
+        SELECT habit_id, bucket, MAX(length) AS streak FROM runs GROUP BY habit_id, bucket
+    ),
+    totals AS (
+        SELECT habit_id, bucket, COUNT(*) AS count, COUNT(num_value) AS num_count,
+               SUM(num_value) AS sum, MIN(num_value) AS min, MAX(num_value) AS max,
+               MAX(CASE WHEN recency = 1 THEN value END) AS last_value
+        FROM scoped
+        GROUP BY habit_id, bucket
+    )
+    INSERT INTO {table} ({columns})
+    SELECT t.habit_id, :period, t.bucket, t.count, t.num_count, t.sum, t.min, t.max,
+           t.last_value, COALESCE(s.streak, 0)
+    FROM totals t
+    LEFT JOIN streaks s ON s.habit_id = t.habit_id AND s.bucket = t.bucket
+'''
+
+
+def bucket_range(period, first, last):
+    """
+    Widen a date range to whole buckets.
+
+    Returns:
+        start, end: ISO dates of the first day of first's bucket and the
+            last day of last's bucket
+    """
+    first, last = date.fromisoformat(first), date.fromisoformat(last)
+    if period == 'week':
+        start = first - timedelta(days=first.weekday())
+        end = last + timedelta(days=6 - last.weekday())
+    else:
+        start = first.replace(day=1)
+        end = (last.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start.isoformat(), end.isoformat()
+
+
+def _refresh(conn, table, ranges, delete=True):
+    if not ranges:
+        return
+    for period, bucket in PERIODS.items():
+        params = {'period': period, 'ranges': json.dumps([
+            [habit_id, *bucket_range(period, first, last)] for habit_id, first, last in ranges])}
+        if delete:
+            conn.execute(DELETE_SQL.format(touched=TOUCHED_SQL, table=table), params)
+        conn.execute(REFRESH_SQL.format(touched=TOUCHED_SQL, bucket=bucket, table=table, columns=COLUMNS),
+                     params)
+
+
+def refresh(conn, touched):
+    """
+    Recompute the rollups covering the given entry dates.
+
+    Buckets are rebuilt from the entries table rather than adjusted by
+    deltas, which keeps min, max, last value and streak exact after edits
+    and deletes. Only the buckets between each habit's earliest and latest
+    touched date are recomputed, all habits at once.
+
+    Args:
+        conn: Database connection; the caller owns the transaction
+        touched: Iterable of (habit_id, date) pairs that were written
+    """
+    ranges = {}
+    for habit_id, day in touched:
+        if day is None:
+            continue
+        first, last = ranges.get(habit_id, (day, day))
+        ranges[habit_id] = (min(first, day), max(last, day))
+    _refresh(conn, 'habit_rollups', [(habit_id, first, last) for habit_id, (first, last) in ranges.items()])
+
+
+def _rebuild_into(conn, table):
+    conn.execute(f'DELETE FROM {table}')
+    ranges = conn.execute('SELECT habit_id, MIN(date), MAX(date) FROM entries GROUP BY habit_id').fetchall()
+    _refresh(conn, table, ranges, delete=False)
+
+
+def rebuild(conn):
+    """Recompute every rollup from scratch. The caller owns the transaction."""
+    _rebuild_into(conn, 'habit_rollups')
+
+
+def check(conn):
+    """
+    Compare the stored rollups against a fresh rebuild.
+
+    Returns:
+        mismatches: List of (habit_id, period, bucket) keys whose stored row
+            is missing, stale or orphaned
+    """
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS expected_rollups AS SELECT * FROM habit_rollups WHERE 0')
+    _rebuild_into(conn, 'temp.expected_rollups')
+    rows = conn.execute(f'''
+        SELECT habit_id, period, bucket FROM (
+            SELECT * FROM (SELECT {COLUMNS} FROM habit_rollups
+                           EXCEPT SELECT {COLUMNS} FROM temp.expected_rollups)
+            UNION ALL
+            SELECT * FROM (SELECT {COLUMNS} FROM temp.expected_rollups
+                           EXCEPT SELECT {COLUMNS} FROM habit_rollups)
+        )
+        GROUP BY habit_id, period, bucket
+        ORDER BY habit_id, period, bucket
+    ''').fetchall()
+    conn.execute('DROP TABLE temp.expected_rollups')
+    return [tuple(row) for row in rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild or verify the habit rollup tables.')
+    parser.add_argument('--database', default='habits.db')
+    parser.add_argument('--rebuild', action='store_true', help='recompute all rollups from the entries')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database, isolation_level=None)
+    if args.rebuild:
+        conn.execute('BEGIN IMMEDIATE')
+        rebuild(conn)
+        conn.execute('COMMIT')
+        print('Rebuilt rollups for', conn.execute('SELECT COUNT(DISTINCT habit_id) FROM habit_rollups').fetchone()[0],
+              'habits')
+    mismatches = check(conn)
+    for habit_id, period, bucket in mismatches:
+        print(f'Mismatch: habit {habit_id} {period} {bucket}')
+    print(f'{len(mismatches)} mismatched buckets')
+    conn.close()
+    raise SystemExit(1 if mismatches else 0)
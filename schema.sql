@@ -1,16 +1,10 @@
-DROP TABLE IF EXISTS users;
-DROP TABLE IF EXISTS habit_boards;
-DROP TABLE IF EXISTS habits;
-DROP TABLE IF EXISTS habit_options;
-DROP TABLE IF EXISTS entries;
-
-CREATE TABLE users (
+CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT NOT NULL UNIQUE,
     password_hash TEXT NOT NULL
 );
 
-CREATE TABLE habit_boards (
+CREATE TABLE IF NOT EXISTS habit_boards (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
     name TEXT NOT NULL,
@@ -20,7 +14,7 @@ CREATE TABLE habit_boards (
     FOREIGN KEY (user_id) REFERENCES users (id)
 );
 
-CREATE TABLE habits (
+CREATE TABLE IF NOT EXISTS habits (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
     board_id INTEGER NOT NULL,
@@ -33,14 +27,14 @@ CREATE TABLE habits (
     FOREIGN KEY (board_id) REFERENCES habit_boards (id)
 );
 
-CREATE TABLE habit_options (
+CREATE TABLE IF NOT EXISTS habit_options (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     habit_id INTEGER NOT NULL,
     option_value TEXT NOT NULL,
     FOREIGN KEY (habit_id) REFERENCES habits (id)
 );
 
-CREATE TABLE entries (
+CREATE TABLE IF NOT EXISTS entries (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     habit_id INTEGER NOT NULL,
     date DATE NOT NULL,
@@ -0,0 +1,131 @@
+from functools import partial
+
+import numpy as np
+from scipy.stats import qmc
+
+# Search backends for ml_utils.generate_recommendations. Each backend takes
+# a SearchSpace, a vectorized objective (rows of X in, scores out, higher is
+# better) and an evaluation budget, and returns the best row it found.
+
+
+class SearchSpace:
+    """
+    Maps points in the unit hypercube onto valid rows of the feature matrix.
+
+    Numeric columns get one dimension scaled to their observed range,
+    boolean columns one dimension rounded to 0/1, and each categorical
+    habit one dimension that picks which of its one-hot columns is set.
+    Any point a sampler produces therefore decodes to a row that respects
+    integrality and has exactly one category active per habit.
+
+    Derived columns (lags, rolling windows, streaks, day of the week) aren't
+    searched: they describe the days leading up to the recommendation, so
+    they are held at their values on the most recent day.
+    """
+
+    def __init__(self, X, layout=None):
+        self.n_columns = X.shape[1]
+        self.lows = X.min().to_numpy(dtype=float)
+        self.highs = X.max().to_numpy(dtype=float)
+        if layout is None:
+            layout = [{'type': 'numeric', 'columns': [i]} for i in range(self.n_columns)]
+        self.continuous = []
+        self.binary = []
+        self.groups = []
+        self.fixed = []
+        for habit in layout:
+            if habit['type'] == 'derived':
+                self.fixed.extend(habit['columns'])
+            elif habit['type'] == 'categorical':
+                self.groups.append(np.asarray(habit['columns']))
+            elif habit['type'] == 'boolean':
+                self.binary.extend(habit['columns'])
+            else:
+                self.continuous.extend(habit['columns'])
+        self.dimensions = len(self.continuous) + len(self.binary) + len(self.groups)
+        self.latest = X.iloc[-1].to_numpy(dtype=float) if len(X) else np.zeros(self.n_columns)
+
+    def decode(self, points):
+        points = np.clip(np.atleast_2d(points), 0, np.nextafter(1, 0))
+        rows = np.zeros((len(points), self.n_columns))
+        rows[:, self.fixed] = self.latest[self.fixed]
+        d = 0
+        for col in self.continuous:
+            rows[:, col] = self.lows[col] + points[:, d] * (self.highs[col] - self.lows[col])
+            d += 1
+        for col in self.binary:
+            rows[:, col] = np.round(points[:, d])
+            d += 1
+        for columns in self.groups:
+            chosen = (points[:, d] * len(columns)).astype(int)
+            rows[np.arange(len(points)), columns[chosen]] = 1
+            d += 1
+        return rows
+
+
+def _best(space, points, scores):
+    best = int(np.argmax(scores))
+    return space.decode(points[best])[0], float(scores[best])
+
+
+def random_search(space, objective, budget, seed=None):
+    """Uniform random sampling of the space; the original recommendation search."""
+    rng = np.random.default_rng(seed)
+    points = rng.random((budget, space.dimensions))
+    return _best(space, points, objective(space.decode(points)))
+
+
+def _initial_design(space, n, sampler, seed):
+    if sampler == 'sobol':
+        m = max(int(np.ceil(np.log2(max(n, 2)))), 1)
+        return qmc.Sobol(space.dimensions, scramble=True, seed=seed).random_base2(m)[:n]
+    return qmc.LatinHypercube(space.dimensions, seed=seed).random(n)
+
+
+def space_filling_search(space, objective, budget, seed=None, sampler='lhs',
+                         init_fraction=0.5, n_starts=5, batch_size=32):
+    """
+    Space-filling seeding followed by local refinement.
+
+    Half the budget (by default) goes on a Latin hypercube or Sobol design,
+    which covers the space far more evenly than uniform random draws. The
+    rest refines the best few seeds: each round samples a batch of Gaussian
+    steps around every incumbent, keeps any improvement and halves the step
+    size for incumbents that didn't improve.
+    """
+    if space.dimensions == 0:
+        return _best(space, np.zeros((1, 0)), objective(space.decode(np.zeros((1, 0)))))
+
+    rng = np.random.default_rng(seed)
+    n_init = max(int(budget * init_fraction), n_starts)
+    points = _initial_design(space, n_init, sampler, seed)
+    scores = objective(space.decode(points))
+    evaluations = len(points)
+
+    order = np.argsort(scores)[::-1][:n_starts]
+    incumbents = points[order].copy()
+    incumbent_scores = scores[order].copy()
+    steps = np.full(len(incumbents), 0.2)
+
+    per_start = max(batch_size // len(incumbents), 1)
+    while evaluations < budget and steps.max() > 1e-3:
+        n = min(per_start, max((budget - evaluations) // len(incumbents), 1))
+        noise = rng.normal(size=(len(incumbents), n, space.dimensions)) * steps[:, None, None]
+        candidates = np.clip(incumbents[:, None, :] + noise, 0, 1).reshape(-1, space.dimensions)
+        candidate_scores = objective(space.decode(candidates)).reshape(len(incumbents), n)
+        evaluations += candidates.shape[0]
+
+        best = candidate_scores.argmax(axis=1)
+        improved = candidate_scores[np.arange(len(incumbents)), best] > incumbent_scores
+        incumbents[improved] = candidates.reshape(len(incumbents), n, -1)[improved, best[improved]]
+        incumbent_scores[improved] = candidate_scores[improved, best[improved]]
+        steps[~improved] *= 0.5
+
+    return _best(space, incumbents, incumbent_scores)
+
+
+SEARCH_BACKENDS = {
+    'random': random_search,
+    'lhs': partial(space_filling_search, sampler='lhs'),
+    'sobol': partial(space_filling_search, sampler='sobol'),
+}
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+from app import create_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'DATABASE': str(tmp_path / 'habits.db'), 'SECRET_KEY': 'test', 'TESTING': True,
+                      'MODEL_CACHE_DIR': str(tmp_path / 'model_cache'), 'PROFILE_DIR': str(tmp_path / 'profiles')})
+    yield app
+    db.get_pool(app).close_all()
+
+
+@pytest.fixture
+def conn(app):
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def board(conn):
+    """A user with one board holding a numeric, a boolean and a categorical habit."""
+    user_id = conn.execute("INSERT INTO users (username, password_hash) VALUES ('alice', 'x')").lastrowid
+    board_id = conn.execute("INSERT INTO habit_boards (user_id, name, board_type) VALUES (?, 'Daily', 'time-series')",
+                            (user_id,)).lastrowid
+    habits = {}
+    for name, variable_type in (('Exercise', 'numeric'), ('Meditated', 'boolean'), ('Mood', 'categorical')):
+        habits[variable_type] = conn.execute(
+            "INSERT INTO habits (user_id, board_id, name, frequency, variable_type) VALUES (?, ?, ?, 'daily', ?)",
+            (user_id, board_id, name, variable_type)).lastrowid
+    for option in ('good', 'bad'):
+        conn.execute('INSERT INTO habit_options (habit_id, option_value) VALUES (?, ?)',
+                     (habits['categorical'], option))
+    conn.commit()
+    return {'user_id': user_id, 'id': board_id, 'habits': habits}
+
+
+@pytest.fixture
+def client(app, board):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = board['user_id']
+    return client
@@ -0,0 +1,29 @@
+def count(conn, table, habit_id):
+    return conn.execute(f'SELECT COUNT(*) FROM {table} WHERE habit_id = ?', (habit_id,)).fetchone()[0]
+
+
+def test_delete_board_of_another_user_changes_nothing(app, client, conn, board):
+    habit_id = board['habits']['numeric']
+    client.post(f'/habit/{habit_id}/log', data={'date': '2024-03-05', 'value': '30'})
+    assert count(conn, 'habit_rollups', habit_id) == 2
+
+    intruder = app.test_client()
+    with intruder.session_transaction() as session:
+        session['user_id'] = board['user_id'] + 1
+    response = intruder.post(f"/board/{board['id']}/delete")
+
+    assert response.status_code == 302
+    assert count(conn, 'entries', habit_id) == 1
+    assert count(conn, 'habit_rollups', habit_id) == 2
+    assert conn.execute('SELECT COUNT(*) FROM habits WHERE board_id = ?', (board['id'],)).fetchone()[0] == 3
+
+
+def test_delete_board(client, conn, board):
+    habit_id = board['habits']['numeric']
+    client.post(f'/habit/{habit_id}/log', data={'date': '2024-03-05', 'value': '30'})
+
+    client.post(f"/board/{board['id']}/delete")
+
+    assert count(conn, 'entries', habit_id) == 0
+    assert count(conn, 'habit_rollups', habit_id) == 0
+    assert conn.execute('SELECT COUNT(*) FROM habit_boards WHERE id = ?', (board['id'],)).fetchone()[0] == 0
@@ -0,0 +1,15 @@
+def test_rename_shows_in_cached_report(client, conn, board):
+    numeric, boolean = board['habits']['numeric'], board['habits']['boolean']
+    for day in range(1, 21):
+        conn.execute('INSERT INTO entries (habit_id, date, value, num_value) VALUES (?, ?, ?, ?)',
+                     (numeric, f'2024-03-{day:02d}', str(day), day))
+        conn.execute('INSERT INTO entries (habit_id, date, value, num_value) VALUES (?, ?, ?, ?)',
+                     (boolean, f'2024-03-{day:02d}', str(day % 2), day % 2))
+    conn.commit()
+
+    names = [habit['name'] for habit in client.get('/stats/correlations').get_json()['habits']]
+    assert 'Exercise' in names
+
+    client.post(f'/habit/{numeric}/edit', data={'name': 'Running', 'description': '', 'frequency': 'daily'})
+    names = [habit['name'] for habit in client.get('/stats/correlations').get_json()['habits']]
+    assert 'Running' in names and 'Exercise' not in names
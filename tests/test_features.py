@@ -0,0 +1,16 @@
+import numpy as np
+
+import features
+
+OPTIONS = {'lags': [], 'windows': [], 'stats': [], 'day_of_week': False, 'streaks': True}
+
+
+def test_streak_counts_non_zero_days():
+    dates = np.array(['2024-03-01', '2024-03-02', '2024-03-03', '2024-03-04', '2024-03-06', '2024-03-07'],
+                     dtype='datetime64[D]')
+    values = np.array([5.0, -2.0, 3.0, 0.0, -1.0, 4.0])
+
+    frame = features.habit_features(dates, values, 'Balance', OPTIONS)
+
+    # 03-04 is a zero and 03-05 wasn't logged; the negative values count
+    assert frame['Balance (streak)'].tolist() == [1, 2, 3, 0, 0, 1, 2]
@@ -0,0 +1,32 @@
+def entries(conn, habit_id):
+    return [tuple(row) for row in conn.execute('SELECT date, value FROM entries WHERE habit_id = ?', (habit_id,))]
+
+
+def test_log_all_stores_entries(client, conn, board):
+    response = client.post(f"/board/{board['id']}/log_all",
+                           data={'log_date': '2024-03-05', f"habit_{board['habits']['numeric']}": '30'})
+    assert response.status_code == 302
+    assert entries(conn, board['habits']['numeric']) == [('2024-03-05', '30')]
+
+
+def test_log_all_rejects_malformed_date(client, conn, board):
+    for log_date in ('garbage', '2024-13-45'):
+        response = client.post(f"/board/{board['id']}/log_all",
+                               data={'log_date': log_date, f"habit_{board['habits']['numeric']}": '30'})
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith(f"/board/{board['id']}/log_all")
+    assert entries(conn, board['habits']['numeric']) == []
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1][1] == 'Enter the date as YYYY-MM-DD'
+
+
+def test_log_habit_rejects_malformed_date(client, conn, board):
+    habit_id = board['habits']['numeric']
+    for day in ('garbage', '2024-13-45'):
+        response = client.post(f'/habit/{habit_id}/log', data={'date': day, 'value': '30'})
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith(f'/habit/{habit_id}/log')
+    assert entries(conn, habit_id) == []
+
+    client.post(f'/habit/{habit_id}/log', data={'date': '2024-03-05', 'value': '30'})
+    assert entries(conn, habit_id) == [('2024-03-05', '30')]
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ml_utils
+
+
+def training_frame(n_days=120, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({'Exercise': rng.normal(30, 10, n_days), 'Sleep': rng.normal(7, 1, n_days)})
+    y = pd.Series(2 * X['Exercise'] - X['Sleep'] + rng.normal(0, 1, n_days))
+    return X, y
+
+
+@pytest.mark.filterwarnings('error::UserWarning')
+def test_predictions_on_arrays_do_not_warn():
+    X, y = training_frame()
+    model, scaler, _, _, _ = ml_utils.train_model(X, y, 'linear_regression')
+
+    predictions = ml_utils.predict_target(model, scaler, X.to_numpy()[:5])
+    assert predictions.shape == (5,)
+    recommendations = ml_utils.generate_recommendations(X, model, scaler, list(X.columns), 'maximize', budget=50)
+    assert recommendations
+
+
+@pytest.mark.filterwarnings('error::UserWarning')
+def test_incremental_update_does_not_warn():
+    X, y = training_frame(130)
+    model, scaler, _, _, _ = ml_utils.train_model(X.iloc[:120], y.iloc[:120], 'linear_regression', incremental=True)
+    state = ml_utils.incremental_state(X.iloc[:120], y.iloc[:120], 120)
+
+    _, _, state = ml_utils.update_model(model, scaler, X, y, state)
+    assert state['rows'] == 130
@@ -0,0 +1,29 @@
+import os
+import pickle
+
+import pytest
+
+import model_cache
+
+
+class Unpicklable:
+    pass
+
+
+@pytest.mark.parametrize('contents', [
+    b'not a pickle at all',
+    # A class that no longer exists, as after upgrading the library it came from
+    pickle.dumps(Unpicklable()).replace(b'test_model_cache', b'gone_module_xyz'),
+])
+def test_unreadable_model_is_discarded(tmp_path, contents):
+    cache = model_cache.ModelCache(str(tmp_path))
+    cache.put('abc', {'model': 1})
+    path = os.path.join(str(tmp_path), 'abc.joblib')
+    with open(path, 'wb') as f:
+        f.write(contents)
+
+    assert cache.get('abc') is None
+    assert not os.path.exists(path)
+
+    cache.put('abc', {'model': 2})
+    assert cache.get('abc') == {'model': 2}
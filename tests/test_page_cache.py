@@ -0,0 +1,12 @@
+import page_cache
+
+
+def test_query_strings_share_one_entry(app, client):
+    cache = page_cache.get_cache(app)
+    for query in ('', '?a=1', '?a=2', '?a=3'):
+        assert client.get(f'/boards{query}').status_code == 200
+    stats = cache.stats()
+    assert stats['stores'] == 1
+    assert stats['hits'] == 3
+    assert stats['entries'] == 1
+
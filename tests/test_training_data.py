@@ -0,0 +1,21 @@
+import training_data
+
+
+def test_categorical_columns_follow_options(conn, board):
+    numeric, mood = board['habits']['numeric'], board['habits']['categorical']
+    options = dict(conn.execute('SELECT option_value, id FROM habit_options WHERE habit_id = ?', (mood,)).fetchall())
+    # Old entries spelled differently still point at the same option
+    for day, value, option in ((1, 'good', 'good'), (2, 'Good', 'good'), (3, 'bad', 'bad'), (4, 'GOOD ', 'good')):
+        date = f'2024-03-0{day}'
+        conn.execute('INSERT INTO entries (habit_id, date, value, num_value) VALUES (?, ?, ?, ?)',
+                     (numeric, date, str(day), day))
+        conn.execute('INSERT INTO entries (habit_id, date, value, option_id) VALUES (?, ?, ?, ?)',
+                     (mood, date, value, options[option]))
+    conn.execute("UPDATE habit_options SET option_value = 'great' WHERE id = ?", (options['good'],))
+
+    X, y, feature_names, layout = training_data.load_training_matrix(conn, numeric, [mood])
+
+    assert feature_names == ['Mood_great', 'Mood_bad']
+    assert layout[0]['categories'] == ['great', 'bad']
+    assert X['Mood_great'].tolist() == [1, 1, 0, 1]
+    assert X['Mood_bad'].tolist() == [0, 0, 1, 0]
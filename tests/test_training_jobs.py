@@ -0,0 +1,41 @@
+import time
+
+import training_jobs
+
+
+def square(x):
+    return x * x
+
+
+def wait_for(queue, job, user_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = queue.get(job.id, user_id)
+        if job.status not in training_jobs.ACTIVE_STATES or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_job_result_is_stored(app, board):
+    queue = training_jobs.get_queue(app)
+    stored = []
+    job = queue.submit(board['user_id'], {}, square, 7, on_success=stored.append)
+
+    job = wait_for(queue, job, board['user_id'])
+    assert job.status == 'done'
+    assert job.result == 49
+    assert stored == [49]
+
+
+def test_failing_on_success_fails_the_job(app, board, caplog):
+    def on_success(result):
+        raise OSError('disk full')
+
+    queue = training_jobs.get_queue(app)
+    job = queue.submit(board['user_id'], {}, square, 7, on_success=on_success)
+
+    job = wait_for(queue, job, board['user_id'])
+    assert job.status == 'failed'
+    assert job.error == 'disk full'
+    assert job.result is None
+    assert 'Saving the result of training job' in caplog.text
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+import features
+
+
+def load_training_matrix(conn, target_habit_id, feature_habit_ids, feature_options=None, feature_cache=None):
+    """
+    Load the target and feature series for model training in one query.
+
+    The rows come back long-format (habit, date, value) and are pivoted
+    straight into a dense matrix keyed by date, with the same layout and
+    fill rules as ml_utils.preprocess_data: one column per numeric/boolean
+    feature, one column per option for categorical features, and gaps
+    forward- then backward-filled.
+
+    With feature_options, the derived columns from features.py (lags,
+    rolling windows and streaks of each numeric/boolean feature, and the
+    day of the week) are appended after the habit columns.
+
+    Args:
+        conn: Database connection
+        target_habit_id: ID of the numeric/boolean habit to predict
+        feature_habit_ids: List of habit IDs to use as features
+        feature_options: Optional dictionary from features.parse_options
+        feature_cache: Optional features.FeatureCache to reuse each habit's
+            derived columns while its data_version is unchanged
+
+    Returns:
+        X: Feature matrix indexed by date
+        y: Target vector indexed by date
+        feature_names: List of feature names
+        layout: One dictionary per feature habit with its 'habit_id', 'name',
+            'type', the indices of its 'columns' in X and, for categorical
+            habits, the 'categories' those columns stand for. Derived
+            columns have the type 'derived' and the habit_id they were
+            computed from (None for the day of the week)
+    """
+    target_habit_id = int(target_habit_id)
+    feature_habit_ids = [int(habit_id) for habit_id in feature_habit_ids]
+    habit_ids = list(dict.fromkeys([target_habit_id] + feature_habit_ids))
+    placeholders = ','.join('?' * len(habit_ids))
+
+    habits = {row['id']: row for row in conn.execute(
+        f'SELECT id, name, variable_type, data_version FROM habits WHERE id IN ({placeholders})', habit_ids)}
+    # Categorical entries are grouped on their option, labelled with its
+    # current spelling; entries matching none of the options are left out
+    rows = conn.execute(f'''
+        SELECT e.habit_id, e.date, e.num_value, e.option_id, o.option_value
+        FROM entries e
+        JOIN habits h ON h.id = e.habit_id
+        LEFT JOIN habit_options o ON o.id = e.option_id
+        WHERE e.habit_id IN ({placeholders})
+          AND (e.num_value IS NOT NULL OR (h.variable_type = 'categorical' AND o.id IS NOT NULL))
+        ORDER BY e.habit_id, e.date
+    ''', habit_ids).fetchall()
+
+    frame = pd.DataFrame.from_records(rows, columns=['habit_id', 'date', 'num_value', 'option_id', 'option'])
+    positions = frame.groupby('habit_id', sort=False).indices
+    dates = pd.Index(np.sort(frame['date'].unique()), name='date')
+    date_rows = dates.get_indexer(frame['date'])
+    num_values = frame['num_value'].to_numpy(dtype=float)
+
+    # Work out the column layout before allocating the matrix
+    feature_names = []
+    layout = []
+    blocks = []
+    for habit_id in feature_habit_ids:
+        habit = habits.get(habit_id)
+        idx = positions.get(habit_id)
+        if habit is None or idx is None:
+            continue
+        if habit['variable_type'] == 'categorical':
+            codes, _ = pd.factorize(frame['option_id'].to_numpy()[idx])
+            _, first = np.unique(codes, return_index=True)
+            categories = frame['option'].to_numpy()[idx][first]
+            layout.append({'habit_id': habit_id, 'name': habit['name'], 'type': 'categorical',
+                           'columns': list(range(len(feature_names), len(feature_names) + len(categories))),
+                           'categories': list(categories)})
+            feature_names.extend(f"{habit['name']}_{category}" for category in categories)
+            blocks.append((idx, codes, len(categories)))
+        else:
+            layout.append({'habit_id': habit_id, 'name': habit['name'], 'type': habit['variable_type'],
+                           'columns': [len(feature_names)]})
+            feature_names.append(habit['name'])
+            blocks.append((idx, None, 1))
+
+    matrix = np.full((len(dates), len(feature_names) + 1), np.nan)
+    target_idx = positions.get(target_habit_id, np.array([], dtype=np.intp))
+    matrix[date_rows[target_idx], 0] = num_values[target_idx]
+
+    col = 1
+    for idx, codes, width in blocks:
+        if codes is None:
+            matrix[date_rows[idx], col] = num_values[idx]
+        else:
+            one_hot = np.zeros((len(idx), width))
+            one_hot[np.arange(len(idx)), codes] = 1
+            matrix[date_rows[idx], col:col + width] = one_hot
+        col += width
+
+    merged_df = pd.DataFrame(matrix, index=dates, columns=['target'] + feature_names)
+    if feature_options:
+        merged_df = _add_derived(merged_df, frame, positions, habits, feature_habit_ids,
+                                 feature_options, feature_cache, feature_names, layout)
+    merged_df = merged_df.ffill().bfill()
+    return merged_df.drop(columns=['target']), merged_df['target'], feature_names, layout
+
+
+def _add_derived(merged_df, frame, positions, habits, feature_habit_ids, options, cache, feature_names, layout):
+    # Derived columns are built per habit on its own daily calendar, then
+    # picked out at the training rows' dates
+    days = pd.to_datetime(frame['date']).to_numpy(dtype='datetime64[D]')
+    num_values = frame['num_value'].to_numpy(dtype=float)
+    blocks = []
+    for habit_id in feature_habit_ids:
+        habit = habits.get(habit_id)
+        idx = positions.get(habit_id)
+        if habit is None or idx is None or habit['variable_type'] == 'categorical':
+            continue
+        if cache is not None:
+            derived = cache.get(habit, days[idx], num_values[idx], options)
+        else:
+            derived = features.habit_features(days[idx], num_values[idx], habit['name'], options)
+        if derived.shape[1]:
+            blocks.append((habit_id, derived.reindex(merged_df.index)))
+    if options['day_of_week']:
+        blocks.append((None, features.day_of_week_features(merged_df.index)))
+
+    for habit_id, block in blocks:
+        start = len(feature_names)
+        if habit_id is None:
+            layout.append({'habit_id': None, 'name': 'Day of week', 'type': 'derived',
+                           'columns': list(range(start, start + block.shape[1]))})
+        else:
+            layout.extend({'habit_id': habit_id, 'name': name, 'type': 'derived', 'columns': [start + i]}
+                          for i, name in enumerate(block.columns))
+        feature_names.extend(block.columns)
+    if not blocks:
+        return merged_df
+    return pd.concat([merged_df] + [block for _, block in blocks], axis=1)
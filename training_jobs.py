@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Coarse progress reported for each job state. The heavy lifting happens in
+# a separate process, so progress moves in steps rather than continuously.
+PROGRESS = {
+    'queued': 0.0,
+    'running': 0.5,
+    'done': 1.0,
+    'failed': 1.0,
+    'cancelled': 1.0,
+}
+
+ACTIVE_STATES = ('queued', 'running')
+
+
+class JobLimitError(Exception):
+    pass
+
+
+def run_training(X, y, feature_names, layout, model_type, is_classification, optimization_goal, n_jobs=-1,
+                 incremental=False):
+    """
+    Validate, train a model and generate recommendations. Runs in a worker
+    process.
+
+    The requested model type (or, for 'auto', every model type) is scored
+    with walk-forward validation first; 'auto' then trains whichever type
+    scored best.
+
+    With incremental=True the model is built so that ml_utils.update_model
+    can add later days to it, and evaluation['incremental'] holds the state
+    that needs (for model types that support it).
+
+    The time each step took is returned in evaluation['timings'], since
+    metrics recorded in the worker process wouldn't reach the web process.
+
+    Returns:
+        model, scaler, accuracy, recommendations, evaluation
+    """
+    import ml_utils  # Loaded in the worker, not the web process
+
+    timings = {}
+    start = time.perf_counter()
+    model_types = ml_utils.MODEL_TYPES if model_type == 'auto' else (model_type,)
+    evaluation = ml_utils.walk_forward_validate(X, y, model_types, is_classification, n_jobs=n_jobs,
+                                                incremental=incremental)
+    if model_type == 'auto':
+        model_type = evaluation['best_model_type'] or 'random_forest'
+    timings['walk_forward_validate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model, scaler, X_test, y_test, accuracy = ml_utils.train_model(X, y, model_type, is_classification, incremental)
+    timings['train_model'] = time.perf_counter() - start
+    if incremental and model_type in ml_utils.INCREMENTAL_MODEL_TYPES:
+        # Fitted on the days before the test split. If train_model had to
+        # shuffle instead, treat every current day as seen
+        trained_rows = len(X) - len(X_test)
+        if not X_test.index.equals(X.index[trained_rows:]):
+            trained_rows = len(X)
+        evaluation['incremental'] = ml_utils.incremental_state(X, y, trained_rows)
+
+    start = time.perf_counter()
+    recommendations = ml_utils.generate_recommendations(X, model, scaler, feature_names, optimization_goal, layout)
+    timings['generate_recommendations'] = time.perf_counter() - start
+
+    evaluation['model_type'] = model_type
+    evaluation['holdout_score'] = round(float(accuracy), 4)
+    evaluation['timings'] = timings
+    return model, scaler, accuracy, recommendations, evaluation
+
+
+def _run_job(database, job_id, fn, *args):
+    # Runs in the pool process. The job is claimed first, so one cancelled
+    # from any web worker while it waited in the queue is skipped.
+    conn = db.connect(database)
+    try:
+        with conn:
+            claimed = conn.execute(
+                "UPDATE training_jobs SET status = 'running', started = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)).rowcount
+    finally:
+        conn.close()
+    if not claimed:
+        raise CancelledError()
+    return fn(*args)
+
+
+class TrainingJob:
+    def __init__(self, id, user_id, context, status='queued', error=None, result=None, created=None, finished=None):
+        self.id = id
+        self.user_id = user_id
+        self.context = context  # Whatever the results page needs to render
+        self.status = status
+        self.error = error
+        self.result = result  # JSON-ready, e.g. the recommendations
+        self.created = created or time.time()
+        self.finished = finished
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['user_id'], json.loads(row['context']), row['status'], row['error'],
+                   json.loads(row['result']) if row['result'] else None, row['created'], row['finished'])
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': PROGRESS[self.status],
+            'error': self.error,
+            'elapsed': round((self.finished or time.time()) - self.created, 3),
+        }
+
+
+class TrainingQueue:
+    """
+    Runs model training in a local process pool.
+
+    Job state lives in the training_jobs table rather than in this process,
+    so with several web worker processes any of them can report on, cancel
+    or show the result of a job another one started, and the per-user limit
+    holds across all of them. At most max_workers jobs train at once in
+    each process; further jobs wait in its pool's queue. Each user may have
+    at most per_user_limit queued or running jobs. Finished jobs are kept
+    for job_ttl seconds so their results can be fetched, then dropped; jobs
+    still active after that long (their process died) are marked failed.
+    """
+
+    def __init__(self, pool, max_workers=2, per_user_limit=2, job_ttl=3600):
+        self.pool = pool
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.job_ttl = job_ttl
+        self._futures = {}  # Jobs submitted by this process, by id
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Created on first use, and again after a fork, so each web worker
+        # process owns its own pool
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._pid = os.getpid()
+            self._futures = {}
+        return self._executor
+
+    @contextmanager
+    def _connect(self):
+        # A pooled connection of its own: _finish runs outside any request
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    def _prune(self, conn):
+        now = time.time()
+        conn.execute('''
+            UPDATE training_jobs SET status = 'failed', error = 'Training was interrupted', finished = ?
+            WHERE status IN ('queued', 'running') AND created < ?
+        ''', (now, now - self.job_ttl))
+        conn.execute('DELETE FROM training_jobs WHERE finished < ?', (now - self.job_ttl,))
+
+    def _insert(self, conn, job, result=None):
+        conn.execute('''
+            INSERT INTO training_jobs (id, user_id, status, context, result, created, finished)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (job.id, job.user_id, job.status, json.dumps(job.context),
+              None if result is None else json.dumps(result, default=float), job.created, job.finished))
+
+    def submit(self, user_id, context, fn, *args, on_success=None, store=None):
+        """
+        Queue fn(*args) to run in the process pool.
+
+        Args:
+            user_id: Owner of the job
+            context: JSON-ready dictionary stored with the job for rendering
+                its results
+            fn: Picklable top-level function to run
+            on_success: Optional callback run in this process with the result,
+                e.g. to store the trained model in the cache
+            store: Optional function turning the result into the JSON-ready
+                value kept as the job's result (default: the result itself)
+
+        Returns:
+            job: The queued TrainingJob
+
+        Raises:
+            JobLimitError: If the user already has per_user_limit active jobs
+        """
+        job = TrainingJob(uuid.uuid4().hex, user_id, context)
+        with self._connect() as conn:
+            # Count and insert under the write lock, so two workers can't
+            # both let a user past the limit
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._prune(conn)
+                active = conn.execute('''
+                    SELECT COUNT(*) FROM training_jobs WHERE user_id = ? AND status IN ('queued', 'running')
+                ''', (user_id,)).fetchone()[0]
+                if active >= self.per_user_limit:
+                    raise JobLimitError(f'You already have {active} models training. '
+                                        f'Wait for one to finish or cancel it.')
+                self._insert(conn, job)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        with self._lock:
+            future = self._get_executor().submit(_run_job, self.pool.database, job.id, fn, *args)
+            self._futures[job.id] = future
+        future.add_done_callback(lambda future: self._finish(job.id, future, on_success, store))
+        return job
+
+    def complete(self, user_id, context, result):
+        """Record a job whose result was already available, e.g. from the model cache."""
+        job = TrainingJob(uuid.uuid4().hex, user_id, context, status='done', result=result)
+        job.finished = job.created
+        with self._connect() as conn:
+            with conn:
+                self._prune(conn)
+                self._insert(conn, job, result)
+        return job
+
+    def _status(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT status FROM training_jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _finish(self, job_id, future, on_success, store):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        try:
+            result = future.result()
+        except CancelledError:
+            return  # Already marked cancelled
+        except Exception as e:
+            status, stored, error = 'failed', None, str(e)
+        else:
+            try:
+                stored = store(result) if store is not None else result
+                if on_success is not None and self._status(job_id) in ACTIVE_STATES:
+                    on_success(result)
+                status, error = 'done', None
+            except Exception as e:
+                # The model trained but wasn't cached or kept; fail the job
+                # so its page says so instead of showing results that aren't there
+                logger.exception('Saving the result of training job %s failed', job_id)
+                status, stored, error = 'failed', None, str(e)
+        with self._connect() as conn:
+            with conn:
+                # A job cancelled meanwhile keeps its cancelled state and
+                # its result is discarded
+                conn.execute('''
+                    UPDATE training_jobs SET status = ?, result = ?, error = ?, finished = ?
+                    WHERE id = ? AND status IN ('queued', 'running')
+                ''', (status, None if stored is None else json.dumps(stored, default=float), error,
+                      time.time(), job_id))
+
+    def get(self, job_id, user_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM training_jobs WHERE id = ? AND user_id = ?',
+                               (job_id, user_id)).fetchone()
+        return TrainingJob.from_row(row) if row else None
+
+    def cancel(self, job_id, user_id):
+        """
+        Cancel a job. A queued job is skipped when its turn comes (and, if
+        this process queued it, removed from the pool at once); a running
+        job can't be interrupted, so it finishes in the background and its
+        result is discarded.
+        """
+        with self._connect() as conn:
+            with conn:
+                conn.execute('''
+                    UPDATE training_jobs SET status = 'cancelled', finished = ?
+                    WHERE id = ? AND user_id = ? AND status IN ('queued', 'running')
+                ''', (time.time(), job_id, user_id))
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+        return self.get(job_id, user_id)
+
+    def stats(self):
+        # Across every worker process sharing the database
+        counts = {state: 0 for state in PROGRESS}
+        with self._connect() as conn:
+            counts.update(conn.execute('SELECT status, COUNT(*) FROM training_jobs GROUP BY status').fetchall())
+        counts['max_workers'] = self.max_workers
+        return counts
+
+
+def get_queue(app=None):
+    app = app or current_app
+    return app.extensions['training_queue']
+
+
+def init_app(app):
+    app.config.setdefault('TRAINING_WORKERS', 2)
+    app.config.setdefault('TRAINING_JOBS_PER_USER', 2)
+    app.config.setdefault('TRAINING_JOB_TTL', 3600)
+    # Threads each training job uses to fit cross-validation folds
+    app.config.setdefault('TRAINING_CV_JOBS', 2)
+
+    app.extensions['training_queue'] = TrainingQueue(db.get_pool(app),
+                                                     max_workers=app.config['TRAINING_WORKERS'],
+                                                     per_user_limit=app.config['TRAINING_JOBS_PER_USER'],
+                                                     job_ttl=app.config['TRAINING_JOB_TTL'])
@@ -0,0 +1,21 @@
+import gc
+
+from app import create_app
+
+# Entry point for multi-process WSGI servers, e.g.
+#
+#   gunicorn --preload --workers 4 --bind 0.0.0.0:8000 wsgi:app
+#
+# With --preload the app is built once in the master process (running the
+# migrations once) and the workers are forked from it, sharing its memory
+# copy-on-write; set HABITS_PRELOAD_ML=1 to share the ML libraries too
+# instead of each worker importing its own copy. Connection pools and the
+# training process pool notice they are in a new process and start fresh.
+# MULTIPROCESS makes the page cache default to a directory next to the
+# database, so every worker sees every other worker's writes.
+
+app = create_app({'MULTIPROCESS': True})
+
+# Keep the garbage collector in the workers from touching (and so copying)
+# the objects inherited from the master
+gc.freeze()